@@ -10,6 +10,8 @@ const app = Vue.createApp({
             },
             rrRanking: [],
             shiftRanking: [],
+            statsStream: null, // 排行榜即時推播連線
+            statsStreamRetry: null, // 推播被拒後的重試計時器
             isAdmin: false,
             currentTab: 'employees',
             statistics: {
@@ -168,12 +170,16 @@ const app = Vue.createApp({
         try {
             await this.refreshData();
             await this.reloadQuotas();
+            this.openStatsStream();
         } catch (error) {
             console.log('離線模式，無法載入數據');
         }
     },
 
     beforeUnmount() {
+        // 關閉排行榜推播連線
+        this.closeStatsStream();
+
         // 清除防抖計時器
         if (this.loadWeeklyStatsTimeout) {
             clearTimeout(this.loadWeeklyStatsTimeout);
@@ -249,6 +255,57 @@ const app = Vue.createApp({
                 this.shiftRanking = [];
             }
         },
+        openStatsStream() {
+            // 以 SSE 接收排行榜變動，不再重複輪詢 /api/vote_stats
+            if (!window.EventSource || this.statsStream) return;
+            const { year, month } = this.getCurrentYearMonth();
+            const stream = new EventSource(`http://127.0.0.1:5000/api/stream/vote_stats?year=${year}&month=${month}`);
+
+            stream.addEventListener('snapshot', (event) => {
+                const data = JSON.parse(event.data);
+                this.rrRanking = Array.isArray(data.rr_ranking) ? data.rr_ranking : [];
+                this.shiftRanking = Array.isArray(data.shift_ranking) ? data.shift_ranking : [];
+            });
+            stream.addEventListener('delta', (event) => {
+                const data = JSON.parse(event.data);
+                this.rrRanking = this.applyRankingChanges(this.rrRanking, data.changes, 'rr');
+                this.shiftRanking = this.applyRankingChanges(this.shiftRanking, data.changes, 'shift');
+            });
+            stream.onerror = () => {
+                // 連線中斷時 EventSource 會自動重連，期間先以一般查詢補上
+                console.warn('排行榜推播中斷，改以查詢更新');
+                this.loadStatistics();
+                // 伺服器拒絕（連線數已達上限 / 重新啟動中）時不會自動重連，稍後自行重試
+                if (stream.readyState === EventSource.CLOSED) {
+                    this.closeStatsStream();
+                    this.statsStreamRetry = setTimeout(() => this.openStatsStream(), 30000);
+                }
+            };
+            this.statsStream = stream;
+        },
+        closeStatsStream() {
+            if (this.statsStreamRetry) {
+                clearTimeout(this.statsStreamRetry);
+                this.statsStreamRetry = null;
+            }
+            if (this.statsStream) {
+                this.statsStream.close();
+                this.statsStream = null;
+            }
+        },
+        applyRankingChanges(ranking, changes, group) {
+            // 差異包含所有名次變動的候選人，直接放到新名次即可
+            const updated = [...ranking];
+            changes.filter(change => change.group === group).forEach(change => {
+                updated[change.rank - 1] = {
+                    emp_id: change.emp_id,
+                    name: change.name,
+                    shift_type: change.shift_type,
+                    vote_count: change.vote_count
+                };
+            });
+            return updated;
+        },
         getCurrentYearMonth() {
             const now = new Date();
             return {
@@ -1,35 +1,82 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, g, request, jsonify, make_response, send_from_directory, stream_with_context
 from flask_cors import CORS
 from datetime import datetime, timedelta
+import bisect
+import calendar
+import functools
+import gzip
+import hashlib
+import itertools
 import json
+import mimetypes
+import mmap
 import os
+import sys
+import queue
+import re
+import signal
+import socket
+import struct
+import zipfile
 import csv
+import io
 import configparser
+import sqlite3
+import threading
+import time
+from array import array
+from collections import ChainMap, Counter, OrderedDict, deque, namedtuple
+from collections.abc import Sequence
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
+from types import MappingProxyType
 
+import click
 from loguru import logger
+from werkzeug.serving import BaseWSGIServer
+
+try:
+    import fcntl
+except ImportError:  # Windows 無 fcntl，僅使用行程內鎖
+    fcntl = None
+
+try:
+    import numpy as np
+except ImportError:  # 未安裝 NumPy 時跨月分析改以純 Python 計算
+    np = None
+
+try:
+    import brotli
+except ImportError:  # 未安裝 brotli 時前端資源只預先壓縮 gzip
+    brotli = None
 
 app = Flask(__name__)
 CORS(app)
 
-# 讀取配置文件
+# 讀取配置文件（啟動時設定；配額等執行期設定請用 get_config()）
+CONFIG_FILE = Path('config.ini')
 config = configparser.ConfigParser()
-config.read('config.ini', encoding='utf-8')
+config.read(CONFIG_FILE, encoding='utf-8')
 
 # 數據根目錄
 DATA_ROOT = Path(config.get('SYSTEM', 'data_directory', fallback='./data'))
 DATA_ROOT.mkdir(exist_ok=True)
 
 # 獲取當前月份的資料目錄
-def get_month_dir(year=None, month=None):
-    """取得指定年月的資料目錄,預設為當前月份"""
+def get_month_dir(year=None, month=None, create=False):
+    """
+    取得指定年月的資料目錄,預設為當前月份
+    create: 只有寫入路徑才需要建立目錄，一般查詢不會在資料樹留下空目錄
+    """
     if year is None or month is None:
         now = datetime.now()  # 👈 每次調用都動態取得當前時間
         year = now.year
         month = now.month
     
     month_dir = DATA_ROOT / str(year) / f"{month:02d}"
-    month_dir.mkdir(parents=True, exist_ok=True)  # 👈 自動建立目錄!
+    if create:
+        month_dir.mkdir(parents=True, exist_ok=True)
     return month_dir
 
 # 獲取月份資料檔案路徑
@@ -53,6 +100,130 @@ def get_employees_file(year=None, month=None):
     month_dir = get_month_dir(year, month)
     return month_dir / 'employees.csv'
 
+def get_vote_log_file(year=None, month=None):
+    """獲取月度票數增量記錄文件（尚未合併回 monthly_votes.csv / employees.csv 的投票）"""
+    month_dir = get_month_dir(year, month)
+    return month_dir / 'vote_log.csv'
+
+def get_vote_archive_file(year=None, month=None):
+    """獲取已封存月份的投票記錄檔 (格式: yyyymm.varc)，見 VoteArchive"""
+    if year is None or month is None:
+        now = datetime.now()
+        year = now.year
+        month = now.month
+
+    month_dir = get_month_dir(year, month)
+    return month_dir / f"{year}{month:02d}.varc"
+
+def get_roster_import_file(year=None, month=None):
+    """獲取名冊匯入記錄（上次匯入的 emoinfo.json 雜湊與結果簽章）"""
+    month_dir = get_month_dir(year, month)
+    return month_dir / '.roster_import.json'
+
+# 效能指標
+class Metrics:
+    """
+    行程內的效能指標（計數器 / 量表 / 直方圖），以 Prometheus 文字格式輸出
+    每次記錄只做一次加鎖的字典更新，熱路徑上的開銷可忽略
+    """
+
+    LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._meta = {}         # 名稱 → (類型, 說明)
+        self._values = {}       # (名稱, 標籤) → 數值
+        self._histograms = {}   # (名稱, 標籤) → [各區間計數..., 總和, 筆數]
+
+    def describe(self, name, kind, help_text):
+        self._meta[name] = (kind, help_text)
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        index = bisect.bisect_left(self.LATENCY_BUCKETS, value)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [0] * (len(self.LATENCY_BUCKETS) + 3)
+            histogram[index] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    @staticmethod
+    def _labels(labels, extra=()):
+        pairs = list(labels) + list(extra)
+        if not pairs:
+            return ''
+        escaped = (
+            (key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+            for key, value in pairs
+        )
+        return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+    def render(self):
+        """Prometheus 文字格式（exposition format 0.0.4）"""
+        with self._lock:
+            values = sorted(self._values.items())
+            histograms = sorted((key, list(h)) for key, h in self._histograms.items())
+
+        lines = []
+        described = set()
+
+        def header(name):
+            if name not in described and name in self._meta:
+                kind, help_text = self._meta[name]
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+            described.add(name)
+
+        for (name, labels), value in values:
+            header(name)
+            lines.append(f"{name}{self._labels(labels)} {value}")
+
+        for (name, labels), histogram in histograms:
+            header(name)
+            cumulative = 0
+            for bound, count in zip(self.LATENCY_BUCKETS, histogram):
+                cumulative += count
+                lines.append(f"{name}_bucket{self._labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_bucket{self._labels(labels, [('le', '+Inf')])} {histogram[-1]}")
+            lines.append(f"{name}_sum{self._labels(labels)} {histogram[-2]:.6f}")
+            lines.append(f"{name}_count{self._labels(labels)} {histogram[-1]}")
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+metrics.describe('vote_http_requests_in_flight', 'gauge', '處理中的請求數')
+metrics.describe('vote_http_requests_total', 'counter', '依路由 / 方法 / 狀態碼的請求數')
+metrics.describe('vote_http_request_duration_seconds', 'histogram', '依路由的請求耗時')
+metrics.describe('vote_csv_operations_total', 'counter', '依操作與資料類型的 CSV 讀寫次數')
+metrics.describe('vote_csv_bytes_total', 'counter', '依操作與資料類型的 CSV 讀寫位元組數')
+metrics.describe('vote_cache_requests_total', 'counter', '依快取與結果（hit / miss）的查詢次數')
+metrics.describe('vote_ballot_batches_total', 'counter', '群組提交的批次數')
+metrics.describe('vote_ballots_committed_total', 'counter', '群組提交處理的選票數')
+metrics.describe('vote_admission_active', 'gauge', '依路由已進入寫入路徑的請求數')
+metrics.describe('vote_admission_queue_depth', 'gauge', '依路由排隊等待進入寫入路徑的請求數')
+metrics.describe('vote_admission_wait_seconds', 'histogram', '依路由進入寫入路徑前的等待時間')
+metrics.describe('vote_admission_rejected_total', 'counter', '依路由與原因（queue_full / timeout）回 429 的請求數')
+metrics.describe('vote_static_responses_total', 'counter', '前端資源依內容編碼與狀態碼（200 / 304）的回應數')
+metrics.inc('vote_http_requests_in_flight', 0)
+
+
+def csv_kind(filepath):
+    """由檔名判斷資料類型（指標標籤用）"""
+    name = filepath.name
+    if name in ('employees.csv', 'monthly_votes.csv', 'vote_log.csv'):
+        return name[:-4]
+    if name[:-4].isdigit():
+        return 'votes'
+    return 'other'
+
+
 # CSV 操作輔助函數
 def read_csv(filepath, key_field=None):
     """讀取 CSV 文件，返回列表或字典"""
@@ -61,8 +232,12 @@ def read_csv(filepath, key_field=None):
     
     try:
         with open(filepath, 'r', encoding='utf-8-sig') as f:
+            size = os.fstat(f.fileno()).st_size
             reader = csv.DictReader(f)
             data = list(reader)
+        kind = csv_kind(filepath)
+        metrics.inc('vote_csv_operations_total', op='read', kind=kind)
+        metrics.inc('vote_csv_bytes_total', size, op='read', kind=kind)
         
         if key_field:
             return {row[key_field]: row for row in data}
@@ -71,14 +246,36 @@ def read_csv(filepath, key_field=None):
         logger.error(f"讀取 CSV 失敗 {filepath}: {str(e)}")
         return [] if key_field is None else {}
 
+def fsync_dir(dirpath):
+    """讓目錄項目（新建 / 改名的檔案）落地；Windows 無法開啟目錄，略過"""
+    try:
+        fd = os.open(dirpath, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
 def write_csv(filepath, data, fieldnames):
-    """寫入 CSV 文件"""
+    """寫入 CSV 文件（先寫暫存檔並 fsync，再以 os.replace 取代，中途當機不會留下半個檔案）"""
     try:
         filepath.parent.mkdir(parents=True, exist_ok=True)
-        with open(filepath, 'w', newline='', encoding='utf-8-sig') as f:
+        # 以 . 開頭，月份索引不會把暫存檔當成資料檔
+        tmp_path = filepath.with_name(f".{filepath.name}.tmp")
+        with open(tmp_path, 'w', newline='', encoding='utf-8-sig') as f:
             writer = csv.DictWriter(f, fieldnames=fieldnames)
             writer.writeheader()
             writer.writerows(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, filepath)
+        fsync_dir(filepath.parent)
+        kind = csv_kind(filepath)
+        metrics.inc('vote_csv_operations_total', op='write', kind=kind)
+        metrics.inc('vote_csv_bytes_total', filepath.stat().st_size, op='write', kind=kind)
         logger.info(f"成功寫入 CSV: {filepath}")
     except Exception as e:
         logger.error(f"寫入 CSV 失敗 {filepath}: {str(e)}")
@@ -86,95 +283,1714 @@ def write_csv(filepath, data, fieldnames):
 
 def append_csv(filepath, row, fieldnames):
     """追加一行到 CSV 文件"""
+    append_csv_rows(filepath, [row], fieldnames)
+
+def append_csv_rows(filepath, rows, fieldnames):
+    """一次追加多行到 CSV 文件（整批內容以單次 write 寫入，fsync 後才返回）"""
     try:
         filepath.parent.mkdir(parents=True, exist_ok=True)
-        file_exists = filepath.exists()
+        before = file_signature(filepath)
+        buffer = io.StringIO(newline='')
+        writer = csv.DictWriter(buffer, fieldnames=fieldnames)
+        if before is None:
+            writer.writeheader()
+        writer.writerows(rows)
         with open(filepath, 'a', newline='', encoding='utf-8-sig') as f:
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            if not file_exists:
-                writer.writeheader()
-            writer.writerow(row)
-        logger.info(f"成功追加到 CSV: {filepath}")
+            f.write(buffer.getvalue())
+            f.flush()
+            os.fsync(f.fileno())
+        if before is None:
+            fsync_dir(filepath.parent)
+        kind = csv_kind(filepath)
+        metrics.inc('vote_csv_operations_total', op='append', kind=kind)
+        metrics.inc('vote_csv_bytes_total', filepath.stat().st_size - (before[1] if before else 0),
+                    op='append', kind=kind)
+        logger.info(f"成功追加 {len(rows)} 行到 CSV: {filepath}")
     except Exception as e:
         logger.error(f"追加 CSV 失敗 {filepath}: {str(e)}")
         raise
 
+# 各類 CSV 欄位
+EMPLOYEE_FIELDS = ['emp_id', 'name', 'shift_type', 'has_voted', 'last_vote_time']
+MONTHLY_VOTES_FIELDS = ['emp_id', 'year_month', 'shift_type', 'votes_used']
+VOTE_FIELDS = [
+    'timestamp', 'year_month',
+    'voter_emp_id', 'voter_name', 'voter_shift',
+    'voted_for_emp_id', 'voted_for_name', 'voted_for_shift'
+]
+VOTE_LOG_FIELDS = ['emp_id', 'shift_type', 'votes_used', 'last_vote_time']
+
+# /api/votes 可用的篩選參數 → 投票記錄欄位（皆有索引）
+VOTE_FILTERS = {
+    'voter': 'voter_emp_id',
+    'candidate': 'voted_for_emp_id',
+    'shift': 'voter_shift',
+}
+VOTE_INDEX_FIELDS = list(VOTE_FILTERS.values())
+
+# 串流輸出時每次送出的筆數
+STREAM_CHUNK_ROWS = 500
+
+# 增量記錄累積超過此筆數時合併回 monthly_votes.csv / employees.csv
+VOTE_LOG_COMPACT_THRESHOLD = 500
+
+
+TABLE_FIELDS = {
+    'employees': EMPLOYEE_FIELDS,
+    'monthly_votes': MONTHLY_VOTES_FIELDS,
+    'votes': VOTE_FIELDS,
+    'vote_log': VOTE_LOG_FIELDS,
+}
+
+
+def file_signature(filepath):
+    """取得檔案簽章 (mtime, size)，檔案不存在時回傳 None"""
+    try:
+        st = filepath.stat()
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+# 月份目錄索引
+class MonthCatalog:
+    """
+    記錄每個月份目錄下有哪些資料檔，保存在 DATA_ROOT/catalog.json
+    寫入路徑同步更新索引，查詢月份列表時不需走訪目錄；索引檔不存在時才走訪一次重建
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.manifest = root / 'catalog.json'
+        self._months = {}          # (year, month) → 檔名集合
+        self._signature = 'unloaded'
+        self._lock = None
+
+    def _file_lock(self):
+        # 其他行程也會更新索引檔，更新時以檔案鎖互斥
+        if self._lock is None:
+            self._lock = MonthWriteLock(self.root / '.catalog.lock')
+        return self._lock
+
+    def _load(self):
+        """索引檔有變動（例如其他行程寫入）才重新讀取"""
+        sig = file_signature(self.manifest)
+        if sig == self._signature:
+            return
+        if sig is None:
+            self.rebuild()
+            return
+        try:
+            with open(self.manifest, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self._months = {
+                tuple(int(part) for part in key.split('/')): set(files)
+                for key, files in data.get('months', {}).items()
+            }
+            self._signature = sig
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ 月份索引損壞,重新建立: {e}")
+            self.rebuild()
+
+    def _save(self):
+        data = {
+            'months': {
+                f"{year}/{month:02d}": sorted(files)
+                for (year, month), files in sorted(self._months.items())
+            }
+        }
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.manifest.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.manifest)
+        self._signature = file_signature(self.manifest)
+
+    def rebuild(self):
+        """走訪資料目錄重建索引"""
+        with self._file_lock():
+            months = {}
+            if self.root.exists():
+                for year_dir in self.root.iterdir():
+                    if not (year_dir.is_dir() and year_dir.name.isdigit()):
+                        continue
+                    for month_dir in year_dir.iterdir():
+                        if month_dir.is_dir() and month_dir.name.isdigit():
+                            months[(int(year_dir.name), int(month_dir.name))] = {
+                                f.name for f in month_dir.iterdir()
+                                if f.is_file() and not f.name.startswith('.')
+                            }
+            self._months = months
+            self._save()
+        logger.info(f"📇 已重建月份索引,共 {len(months)} 個月份")
+
+    def months(self):
+        """所有已知月份（排序後）"""
+        self._load()
+        return sorted(self._months)
+
+    def files(self, year, month):
+        self._load()
+        return set(self._months.get((year, month), ()))
+
+    def record(self, year, month, filename, present=True):
+        """寫入路徑呼叫：登記（或移除）月份下的檔案，內容沒變就不寫索引檔"""
+        self._load()
+        if (filename in self._months.get((year, month), ())) == present:
+            return
+        with self._file_lock():
+            self._signature = 'unloaded'
+            self._load()
+            files = self._months.setdefault((year, month), set())
+            if present:
+                files.add(filename)
+            else:
+                files.discard(filename)
+            self._save()
+
+
+# 跨行程變更計數
+class SharedVersions:
+    """
+    各月份的變更計數，保存在 DATA_ROOT/.versions 並以 mmap 在行程間共用
+    寫入路徑在資料落地後遞增；其他 worker 的 MonthState 看到計數改變才需要檢查儲存簽章
+    計數只會讓快取失效，不保證唯一（同時遞增時可能少算一次，但寫入都已落地，讀者仍會重新檢查）
+    """
+
+    SLOTS = 4096
+    SLOT_FORMAT = '<Q'
+
+    def __init__(self, root):
+        self.root = root
+        self._map = None
+
+    def _mapping(self):
+        if self._map is None:
+            self.root.mkdir(parents=True, exist_ok=True)
+            size = self.SLOTS * struct.calcsize(self.SLOT_FORMAT)
+            fd = os.open(self.root / '.versions', os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                if os.fstat(fd).st_size < size:
+                    os.ftruncate(fd, size)
+                self._map = mmap.mmap(fd, size)
+            finally:
+                os.close(fd)
+        return self._map
+
+    def _offset(self, year, month):
+        return (int(year) * 12 + int(month)) % self.SLOTS * struct.calcsize(self.SLOT_FORMAT)
+
+    def get(self, year, month):
+        return struct.unpack_from(self.SLOT_FORMAT, self._mapping(), self._offset(year, month))[0]
+
+    def bump(self, year, month):
+        """遞增月份計數，回傳 (遞增前, 遞增後)"""
+        mapping = self._mapping()
+        offset = self._offset(year, month)
+        before = struct.unpack_from(self.SLOT_FORMAT, mapping, offset)[0]
+        after = (before + 1) % (1 << 64)
+        struct.pack_into(self.SLOT_FORMAT, mapping, offset, after)
+        return before, after
+
+
+_shared_versions = None
+
+
+def shared_versions():
+    # DATA_ROOT 可能在執行期被替換（例如基準測試），計數檔跟著切換
+    global _shared_versions
+    if _shared_versions is None or _shared_versions.root != DATA_ROOT:
+        _shared_versions = SharedVersions(DATA_ROOT)
+    return _shared_versions
+
+
+# 封存月份的投票記錄
+ARCHIVE_MAGIC = b'VARC'
+ARCHIVE_VERSION = 1
+# magic, 版本, 班別數, 記錄筆數, 人員數, 字串數, year_month 字串索引
+ARCHIVE_HEADER = struct.Struct('<4sHHIIII')
+ARCHIVE_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+ARCHIVE_NO_TIME = -(1 << 63)     # 空白時間
+
+
+def _archive_section(buffer, column):
+    """追加一個欄位區段，區段起點對齊 8 位元組"""
+    buffer.extend(b'\0' * (-len(buffer) % 8))
+    if sys.byteorder == 'big' and column.itemsize > 1:
+        column = array(column.typecode, column)
+        column.byteswap()
+    buffer.extend(column.tobytes())
+
+
+def encode_vote_archive(rows, year_month):
+    """
+    將一個月份的投票記錄編碼為封存格式，回傳 bytes
+    資料無法無損轉換時（月份不一致、時間格式不同、班別種類過多）回傳 None
+    """
+    strings = {}
+    people = {}
+    shifts = {}
+
+    def intern(text):
+        return strings.setdefault(text, len(strings))
+
+    def person(emp_id, name):
+        return people.setdefault((intern(emp_id or ''), intern(name or '')), len(people))
+
+    year_month_idx = intern(year_month)
+    timestamps, voters, candidates = array('q'), array('I'), array('I')
+    voter_shifts, candidate_shifts = array('B'), array('B')
+
+    for row in rows:
+        if (row.get('year_month') or '') != year_month:
+            return None
+        text = row.get('timestamp') or ''
+        if text:
+            try:
+                ts = calendar.timegm(time.strptime(text, ARCHIVE_TIME_FORMAT))
+            except ValueError:
+                return None
+            if time.strftime(ARCHIVE_TIME_FORMAT, time.gmtime(ts)) != text:
+                return None
+        else:
+            ts = ARCHIVE_NO_TIME
+        timestamps.append(ts)
+        voters.append(person(row.get('voter_emp_id'), row.get('voter_name')))
+        candidates.append(person(row.get('voted_for_emp_id'), row.get('voted_for_name')))
+        voter_shifts.append(shifts.setdefault(row.get('voter_shift') or '', len(shifts)) & 0xFF)
+        candidate_shifts.append(shifts.setdefault(row.get('voted_for_shift') or '', len(shifts)) & 0xFF)
+        if len(shifts) > 256:
+            return None
+
+    shift_table = array('I', (intern(shift) for shift in shifts))
+    encoded = [text.encode('utf-8') for text in strings]
+    offsets = array('I', [0])
+    for data in encoded:
+        offsets.append(offsets[-1] + len(data))
+    people_table = array('I', itertools.chain.from_iterable(people))
+
+    buffer = bytearray(ARCHIVE_HEADER.pack(
+        ARCHIVE_MAGIC, ARCHIVE_VERSION, len(shift_table), len(timestamps),
+        len(people), len(strings), year_month_idx
+    ))
+    for column in (offsets, array('B', b''.join(encoded)), shift_table, people_table,
+                   timestamps, voters, candidates, voter_shifts, candidate_shifts):
+        _archive_section(buffer, column)
+    return bytes(buffer)
+
+
+def write_vote_archive(filepath, rows, year_month):
+    """寫入封存檔（暫存檔 fsync 後以 os.replace 取代），資料無法無損轉換時回傳 False"""
+    data = encode_vote_archive(rows, year_month)
+    if data is None:
+        return False
+    filepath.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = filepath.with_name(f".{filepath.name}.tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, filepath)
+    fsync_dir(filepath.parent)
+    logger.info(f"成功寫入封存檔: {filepath} ({len(data)} bytes)")
+    return True
+
+
+class VoteArchive(Sequence):
+    """
+    已封存月份的投票記錄（唯讀，以 mmap 讀取）
+    欄式存放：工號與姓名收在字串字典，投票者 / 候選人為人員索引，班別為一位元組代碼，時間為 epoch 秒
+    以索引取值時才組出與 CSV 相同欄位的資料列；統計直接掃描整數欄位，不需解析
+    用完以 close() 釋放對應（Windows 上對應未釋放前無法刪除或取代檔案）
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._views = []             # 指向 mmap 的 memoryview，關閉前須全部釋放
+        self._readers = 0
+        self._closing = False
+        self._guard = threading.Lock()
+        magic, version, shift_count, rows, people, strings, year_month_idx = \
+            ARCHIVE_HEADER.unpack_from(self._map)
+        if magic != ARCHIVE_MAGIC or version != ARCHIVE_VERSION:
+            raise ValueError(f"不支援的封存檔格式: {path}")
+
+        self._offset = ARCHIVE_HEADER.size
+        offsets = self._column('I', strings + 1)
+        blob = self._column('B', offsets[-1])
+        self.strings = [str(blob[offsets[i]:offsets[i + 1]], 'utf-8') for i in range(strings)]
+        self.shifts = [self.strings[i] for i in self._column('I', shift_count)]
+        pairs = self._column('I', people * 2)
+        self.people = [(self.strings[pairs[i]], self.strings[pairs[i + 1]]) for i in range(0, people * 2, 2)]
+        self.year_month = self.strings[year_month_idx]
+
+        self.timestamps = self._column('q', rows)
+        self.voters = self._column('I', rows)
+        self.candidates = self._column('I', rows)
+        self.voter_shifts = self._column('B', rows)
+        self.candidate_shifts = self._column('B', rows)
+
+    def _column(self, typecode, count):
+        """讀出下一個欄位區段（小端序主機上直接以 memoryview 對應 mmap，不複製）"""
+        self._offset += -self._offset % 8
+        size = array(typecode).itemsize * count
+        view = memoryview(self._map)[self._offset:self._offset + size]
+        self._views.append(view)
+        self._offset += size
+        if size and sys.byteorder == 'big' and typecode != 'B':
+            column = array(typecode, view.tobytes())
+            column.byteswap()
+            return column
+        column = view.cast(typecode)
+        self._views.append(column)
+        return column
+
+    def pin(self):
+        """登記一個讀取者；close() 會延到所有讀取者 unpin() 後才釋放對應"""
+        with self._guard:
+            if self._closing:
+                raise ValueError(f"封存檔已關閉: {self.path}")
+            self._readers += 1
+
+    def unpin(self):
+        with self._guard:
+            self._readers -= 1
+            release = self._closing and not self._readers
+        if release:
+            self._release()
+
+    def close(self):
+        """關閉 mmap；仍有讀取者時由最後一個讀取者釋放"""
+        with self._guard:
+            if self._closing:
+                return
+            self._closing = True
+            release = not self._readers
+        if release:
+            self._release()
+
+    def _release(self):
+        for view in reversed(self._views):
+            view.release()
+        self._views.clear()
+        self._map.close()
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def __getitem__(self, pos):
+        if isinstance(pos, slice):
+            return [self[i] for i in range(*pos.indices(len(self)))]
+        return self._row(self.timestamps[pos], self.voters[pos], self.candidates[pos],
+                         self.voter_shifts[pos], self.candidate_shifts[pos])
+
+    def __iter__(self):
+        self.pin()
+        try:
+            row = self._row
+            for columns in zip(self.timestamps, self.voters, self.candidates,
+                               self.voter_shifts, self.candidate_shifts):
+                yield row(*columns)
+        finally:
+            self.unpin()
+
+    def _row(self, ts, voter, candidate, voter_shift, candidate_shift):
+        voter_id, voter_name = self.people[voter]
+        candidate_id, candidate_name = self.people[candidate]
+        return {
+            'timestamp': '' if ts == ARCHIVE_NO_TIME else time.strftime(ARCHIVE_TIME_FORMAT, time.gmtime(ts)),
+            'year_month': self.year_month,
+            'voter_emp_id': voter_id,
+            'voter_name': voter_name,
+            'voter_shift': self.shifts[voter_shift],
+            'voted_for_emp_id': candidate_id,
+            'voted_for_name': candidate_name,
+            'voted_for_shift': self.shifts[candidate_shift]
+        }
+
+
+# 儲存後端
+class CsvStorage:
+    """CSV 儲存後端：data/YYYY/MM/ 下每種資料各一個 CSV 檔"""
+
+    name = 'csv'
+
+    def __init__(self):
+        self._catalog = None
+
+    @property
+    def catalog(self):
+        # DATA_ROOT 可能在執行期被替換（例如基準測試），索引跟著切換
+        if self._catalog is None or self._catalog.root != DATA_ROOT:
+            self._catalog = MonthCatalog(DATA_ROOT)
+        return self._catalog
+
+    def path(self, year, month, kind):
+        """資料類型對應的檔案路徑"""
+        getter = {
+            'employees': get_employees_file,
+            'monthly_votes': get_monthly_votes_file,
+            'votes': get_month_file,
+            'vote_log': get_vote_log_file,
+        }[kind]
+        return getter(year, month)
+
+    def signature(self, year, month, kind):
+        sig = file_signature(self.path(year, month, kind))
+        if sig is None and kind == 'votes':
+            # 已封存的月份以封存檔為準
+            archived = file_signature(get_vote_archive_file(year, month))
+            return None if archived is None else ('archive',) + archived
+        return sig
+
+    def exists(self, year, month, kind):
+        return self.signature(year, month, kind) is not None
+
+    def read(self, year, month, kind):
+        filepath = self.path(year, month, kind)
+        if kind == 'votes' and not filepath.exists():
+            archive_path = get_vote_archive_file(year, month)
+            if archive_path.exists():
+                return VoteArchive(archive_path)
+        return read_csv(filepath)
+
+    def iter_rows(self, year, month, kind):
+        """逐筆產生資料列，不把整個檔案讀進記憶體（匯出、彙總掃描用）"""
+        filepath = self.path(year, month, kind)
+        if kind == 'votes' and not filepath.exists():
+            archive_path = get_vote_archive_file(year, month)
+            if archive_path.exists():
+                archive = VoteArchive(archive_path)
+                try:
+                    yield from archive
+                finally:
+                    archive.close()
+                return
+        try:
+            f = open(filepath, 'r', encoding='utf-8-sig')
+        except FileNotFoundError:
+            return
+        with f:
+            label = csv_kind(filepath)
+            metrics.inc('vote_csv_operations_total', op='read', kind=label)
+            metrics.inc('vote_csv_bytes_total', os.fstat(f.fileno()).st_size, op='read', kind=label)
+            yield from csv.DictReader(f)
+
+    def write(self, year, month, kind, rows):
+        filepath = self.path(year, month, kind)
+        write_csv(filepath, rows, TABLE_FIELDS[kind])
+        self.catalog.record(year, month, filepath.name)
+        if kind == 'votes':
+            self._remove_archive(year, month)
+
+    def append(self, year, month, kind, rows):
+        filepath = self.path(year, month, kind)
+        if kind == 'votes' and not filepath.exists() and get_vote_archive_file(year, month).exists():
+            # 已封存的月份再寫入時還原成 CSV
+            archive = self.read(year, month, kind)
+            try:
+                existing = list(archive)
+            finally:
+                archive.close()
+            self.write(year, month, kind, existing + list(rows))
+            return
+        append_csv_rows(filepath, rows, TABLE_FIELDS[kind])
+        self.catalog.record(year, month, filepath.name)
+
+    def remove(self, year, month, kind):
+        filepath = self.path(year, month, kind)
+        if filepath.exists():
+            filepath.unlink()
+            logger.info(f"已刪除 CSV: {filepath}")
+        self.catalog.record(year, month, filepath.name, present=False)
+        if kind == 'votes':
+            self._remove_archive(year, month)
+
+    def archive(self, year, month):
+        """
+        將月份的投票記錄轉為封存檔並刪除 CSV，回傳封存筆數
+        沒有投票記錄或無法無損轉換時保留 CSV，回傳 None
+        """
+        filepath = self.path(year, month, 'votes')
+        rows = read_csv(filepath)
+        if not rows:
+            return None
+        archive_path = get_vote_archive_file(year, month)
+        _release_vote_archive(year, month)
+        if not write_vote_archive(archive_path, rows, f"{year}{month:02d}"):
+            logger.warning(f"⚠️ {filepath} 無法無損轉換,保留 CSV")
+            return None
+
+        # 讀回比對，確認無損後才刪除 CSV
+        expected = [{field: row.get(field) or '' for field in VOTE_FIELDS} for row in rows]
+        archive = VoteArchive(archive_path)
+        try:
+            identical = list(archive) == expected
+        finally:
+            archive.close()
+        if not identical:
+            archive_path.unlink()
+            logger.warning(f"⚠️ {archive_path} 讀回內容不一致,保留 CSV")
+            return None
+        self.catalog.record(year, month, archive_path.name)
+        filepath.unlink()
+        fsync_dir(filepath.parent)
+        self.catalog.record(year, month, filepath.name, present=False)
+        return len(rows)
+
+    def _remove_archive(self, year, month):
+        archive_path = get_vote_archive_file(year, month)
+        if archive_path.exists():
+            _release_vote_archive(year, month)
+            archive_path.unlink()
+            logger.info(f"已刪除封存檔: {archive_path}")
+        self.catalog.record(year, month, archive_path.name, present=False)
+
+    def read_rollup(self, year, month):
+        filepath = get_month_dir(year, month) / 'rollup.json'
+        if not filepath.exists():
+            return None
+        try:
+            with open(filepath, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"⚠️ 讀取月份彙總失敗 {filepath}: {e}")
+            return None
+
+    def write_rollup(self, year, month, rollup):
+        filepath = get_month_dir(year, month, create=True) / 'rollup.json'
+        with open(filepath, 'w', encoding='utf-8') as f:
+            json.dump(rollup, f, ensure_ascii=False)
+        self.catalog.record(year, month, filepath.name)
+
+    def all_months(self):
+        """所有存在的年月目錄（查詢月份索引）"""
+        return self.catalog.months()
+
+    def months(self):
+        """有投票資料的年月列表（查詢月份索引）"""
+        return [
+            (year, month) for year, month in self.catalog.months()
+            if self.catalog.files(year, month) & {f"{year}{month:02d}.csv", f"{year}{month:02d}.varc"}
+        ]
+
+
+class SqliteStorage:
+    """
+    SQLite 儲存後端（WAL 模式）
+    每種資料一張表，以 year_month 分區並建立索引；table_versions 記錄各表的寫入版本供快取比對
+    刪除資料表時保留版本列並記為負數（-(版本 + 1)），之後的寫入從絕對值繼續遞增，版本不會重複出現
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, db_path):
+        self.db_path = Path(db_path)
+        self._local = threading.local()
+        conn = self._connect()
+        with conn:
+            for kind, fields in TABLE_FIELDS.items():
+                columns = ', '.join(f"{col} TEXT" for col in self._columns(kind))
+                conn.execute(f"CREATE TABLE IF NOT EXISTS {kind} ({columns})")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_employees_month ON employees (year_month, emp_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_monthly_votes_month ON monthly_votes (year_month, emp_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_vote_log_month ON vote_log (year_month, emp_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_votes_voter ON votes (year_month, voter_emp_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_votes_candidate ON votes (year_month, voted_for_emp_id)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS table_versions ("
+                "year_month TEXT, kind TEXT, version INTEGER, PRIMARY KEY (year_month, kind))"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS month_rollups (year_month TEXT PRIMARY KEY, data TEXT)"
+            )
+
+    @staticmethod
+    def _columns(kind):
+        """year_month 一律作為第一欄（分區鍵）"""
+        return ['year_month'] + [f for f in TABLE_FIELDS[kind] if f != 'year_month']
+
+    def _connect(self):
+        # 每個執行緒各自一條連線；fork 後的子行程須重新連線
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # 每次交易提交都 fsync WAL；群組提交讓一批選票只付一次代價
+            conn.execute("PRAGMA synchronous=FULL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _bump(self, conn, year_month, kind):
+        conn.execute(
+            "INSERT INTO table_versions (year_month, kind, version) VALUES (?, ?, 1) "
+            "ON CONFLICT (year_month, kind) DO UPDATE SET version = abs(version) + 1",
+            (year_month, kind)
+        )
+
+    def _insert(self, conn, year_month, kind, rows):
+        columns = self._columns(kind)
+        conn.executemany(
+            f"INSERT INTO {kind} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+            [
+                [year_month] + [
+                    '' if row.get(col) is None else str(row.get(col))
+                    for col in columns[1:]
+                ]
+                for row in rows
+            ]
+        )
+
+    def signature(self, year, month, kind):
+        row = self._connect().execute(
+            "SELECT version FROM table_versions WHERE year_month = ? AND kind = ?",
+            (f"{year}{month:02d}", kind)
+        ).fetchone()
+        # 已刪除（負數版本）視為不存在
+        return row[0] if row and row[0] > 0 else None
+
+    def exists(self, year, month, kind):
+        return self.signature(year, month, kind) is not None
+
+    def read(self, year, month, kind):
+        return list(self.iter_rows(year, month, kind))
+
+    def iter_rows(self, year, month, kind):
+        """逐筆產生資料列（游標逐批讀取）"""
+        fields = TABLE_FIELDS[kind]
+        cursor = self._connect().execute(
+            f"SELECT {', '.join(fields)} FROM {kind} WHERE year_month = ? ORDER BY rowid",
+            (f"{year}{month:02d}",)
+        )
+        for row in cursor:
+            yield dict(zip(fields, row))
+
+    def write(self, year, month, kind, rows):
+        year_month = f"{year}{month:02d}"
+        conn = self._connect()
+        with conn:
+            conn.execute(f"DELETE FROM {kind} WHERE year_month = ?", (year_month,))
+            self._insert(conn, year_month, kind, rows)
+            self._bump(conn, year_month, kind)
+        logger.info(f"成功寫入 SQLite: {kind} {year_month} ({len(rows)} 筆)")
+
+    def append(self, year, month, kind, rows):
+        year_month = f"{year}{month:02d}"
+        conn = self._connect()
+        with conn:
+            self._insert(conn, year_month, kind, rows)
+            self._bump(conn, year_month, kind)
+        logger.info(f"成功追加 {len(rows)} 筆到 SQLite: {kind} {year_month}")
+
+    def remove(self, year, month, kind):
+        year_month = f"{year}{month:02d}"
+        conn = self._connect()
+        with conn:
+            conn.execute(f"DELETE FROM {kind} WHERE year_month = ?", (year_month,))
+            # 不刪除版本列：重新建立後若從 1 開始，可能與其他 worker 記住的舊簽章相同而沿用過期的快取
+            conn.execute(
+                "UPDATE table_versions SET version = -(abs(version) + 1) WHERE year_month = ? AND kind = ?",
+                (year_month, kind)
+            )
+
+    def read_rollup(self, year, month):
+        row = self._connect().execute(
+            "SELECT data FROM month_rollups WHERE year_month = ?", (f"{year}{month:02d}",)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def write_rollup(self, year, month, rollup):
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO month_rollups (year_month, data) VALUES (?, ?)",
+                (f"{year}{month:02d}", json.dumps(rollup, ensure_ascii=False))
+            )
+
+    def archive(self, year, month):
+        """SQLite 後端已依月份分區並建立索引，不另外封存"""
+        return None
+
+    def months(self):
+        cursor = self._connect().execute(
+            "SELECT year_month FROM table_versions WHERE kind = 'votes' AND version > 0 ORDER BY year_month"
+        )
+        return [(int(ym[:4]), int(ym[4:])) for (ym,) in cursor]
+
+
+def create_storage(backend):
+    """依設定建立儲存後端"""
+    if backend == 'sqlite':
+        db_file = config.get('SYSTEM', 'sqlite_file', fallback='votes.db')
+        return SqliteStorage(DATA_ROOT / db_file)
+    if backend != 'csv':
+        logger.warning(f"⚠️ 未知的儲存後端 '{backend}',改用 csv")
+    return CsvStorage()
+
+
+storage = create_storage(config.get('SYSTEM', 'storage_backend', fallback='csv'))
+
+
+# 得票統計
+class RankedTally:
+    """
+    依得票數遞減排序的候選人統計
+    排序規則與 sorted(..., reverse=True) 相同（同票依首次得票先後），每次 +1 只需往前移動
+    """
+
+    def __init__(self):
+        self.entries = {}       # emp_id → 輸出用資料
+        self.ranking = []       # 排序後的 emp_id
+        self._position = {}     # emp_id → ranking 索引
+        self._first_seen = {}   # emp_id → 首次得票順序
+
+    @classmethod
+    def from_counts(cls, entries):
+        """以已計好的票數建立排行；entries 依首次得票先後排列，vote_count 已填好"""
+        tally = cls()
+        for emp_id, entry in entries:
+            tally.entries[emp_id] = entry
+            tally._first_seen[emp_id] = len(tally._first_seen)
+        tally.ranking = sorted(tally.entries, key=lambda emp_id: -tally.entries[emp_id]['vote_count'])
+        tally._position = {emp_id: pos for pos, emp_id in enumerate(tally.ranking)}
+        return tally
+
+    def add(self, emp_id, make_entry):
+        """候選人得票 +1，回傳 (原名次, 新名次)；首次得票的原名次為 None"""
+        entry = self.entries.get(emp_id)
+        if entry is None:
+            entry = make_entry()
+            self.entries[emp_id] = entry
+            self._first_seen[emp_id] = len(self._first_seen)
+            self._position[emp_id] = len(self.ranking)
+            self.ranking.append(emp_id)
+            old_rank = None
+        else:
+            old_rank = self._position[emp_id]
+        entry['vote_count'] += 1
+        return old_rank, self._move_up(emp_id)
+
+    def _move_up(self, emp_id):
+        pos = self._position[emp_id]
+        count = self.entries[emp_id]['vote_count']
+        seen = self._first_seen[emp_id]
+        while pos > 0:
+            prev = self.ranking[pos - 1]
+            prev_count = self.entries[prev]['vote_count']
+            if prev_count > count or (prev_count == count and self._first_seen[prev] < seen):
+                break
+            self.ranking[pos] = prev
+            self._position[prev] = pos
+            pos -= 1
+        self.ranking[pos] = emp_id
+        self._position[emp_id] = pos
+        return pos
+
+    def position(self, emp_id):
+        """目前名次（0 起算），尚未得票為 None"""
+        return self._position.get(emp_id)
+
+    def as_list(self):
+        """排行榜（複製一份，避免序列化時被其他執行緒修改）"""
+        return [dict(self.entries[emp_id]) for emp_id in self.ranking]
+
+
+# 班別代碼
+SHIFT_QUOTA_KEYS = {'RR': '2000', '輪班': '3000', '2000': '2000', '3000': '3000'}   # 其他值一律視為 2000
+
+
+class ShiftCodes:
+    """
+    班別字串 ↔ 小整數代碼（行程內共用，代碼只增不減）
+    名冊上的班別字串原樣保存（寫回 CSV 不變），顯示名稱與配額鍵在登記時各算一次
+    """
+
+    def __init__(self):
+        self._codes = {}
+        self._lock = threading.Lock()
+        self.raw = []          # 代碼 → 原始字串
+        self.display = []      # 代碼 → RR / 輪班
+        self.quota_key = []    # 代碼 → '2000' / '3000'
+
+    def code(self, value):
+        code = self._codes.get(value)
+        if code is None:
+            with self._lock:
+                code = self._codes.get(value)
+                if code is None:
+                    code = len(self.raw)
+                    self.raw.append(value)
+                    self.display.append(normalize_shift(value))
+                    self.quota_key.append(SHIFT_QUOTA_KEYS.get(value, '2000'))
+                    self._codes[value] = code
+        return code
+
+
+shift_codes = ShiftCodes()
+
+
+class EmployeeRecord:
+    """
+    名冊中的一位員工（取代 csv.DictReader 的字串字典）
+    id 為月份名冊內的連續整數；shift 為 shift_codes 代碼；投票旗標為 bool
+    """
+
+    __slots__ = ('id', 'emp_id', 'name', 'shift', 'has_voted', 'last_vote_time')
+
+    def __init__(self, emp_id, name, shift, has_voted=False, last_vote_time='', id=None):
+        self.id = id
+        self.emp_id = emp_id
+        self.name = name
+        self.shift = shift
+        self.has_voted = has_voted
+        self.last_vote_time = last_vote_time
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(
+            row['emp_id'],
+            row.get('name') or '',
+            shift_codes.code(row.get('shift_type') or ''),
+            row.get('has_voted') == '1',
+            row.get('last_vote_time') or ''
+        )
+
+    @property
+    def shift_type(self):
+        """原始班別字串（2000 / 3000）"""
+        return shift_codes.raw[self.shift]
+
+    @property
+    def display_shift(self):
+        """RR / 輪班"""
+        return shift_codes.display[self.shift]
+
+    @property
+    def quota_key(self):
+        return shift_codes.quota_key[self.shift]
+
+    def voted(self, vote_time):
+        """已投票的複本（原記錄不變）"""
+        return EmployeeRecord(self.emp_id, self.name, self.shift, True, vote_time, self.id)
+
+    def as_row(self):
+        """轉回 employees.csv 的資料列"""
+        return {
+            'emp_id': self.emp_id,
+            'name': self.name,
+            'shift_type': self.shift_type,
+            'has_voted': '1' if self.has_voted else '0',
+            'last_vote_time': self.last_vote_time
+        }
+
+
+class EmployeeRegistry:
+    """
+    月份名冊：工號 → 連續整數 id，id → EmployeeRecord
+    以工號查詢的介面與 dict 相同（in / [] / get / values）；同一工號重複出現時以後者為準
+    """
+
+    def __init__(self, records=()):
+        self.ids = {}
+        self.records = []
+        for record in records:
+            record.id = self.ids.setdefault(record.emp_id, len(self.ids))
+            if record.id == len(self.records):
+                self.records.append(record)
+            else:
+                self.records[record.id] = record
+
+    def id_of(self, emp_id):
+        return self.ids.get(emp_id)
+
+    def get(self, emp_id, default=None):
+        index = self.ids.get(emp_id)
+        return default if index is None else self.records[index]
+
+    def replace(self, record):
+        self.records[record.id] = record
+
+    def values(self):
+        return self.records
+
+    def __getitem__(self, emp_id):
+        return self.records[self.ids[emp_id]]
+
+    def __contains__(self, emp_id):
+        return emp_id in self.ids
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __len__(self):
+        return len(self.records)
+
+
+# 記憶體月份狀態
+class MonthState:
+    """
+    單一月份常駐記憶體的資料狀態
+    - employees: EmployeeRegistry（已套用增量記錄的投票旗標）
+    - votes_used: emp_id → 本月已用票數（已套用增量記錄）
+    - voter_shifts: emp_id → monthly_votes 記錄的班別代碼
+    - votes: 投票記錄列
+    - tallies: 候選人得票排行（'2000' / 'other' 依 voted_for_shift 分組，'all' 為全部）
+    - rollup: 各班別人數 / 投票人數 / 投票數彙總
+    - vote_index: 投票者 / 候選人 / 投票者班別 → 投票記錄索引（遞增）
+    - version: 資料版本，任何內容變動（寫入或重新載入）都會遞增，供 ETag 使用
+    - roster_version: 名冊版本，只在工號 / 姓名 / 班別變動時遞增（投票旗標不算）
+    - candidate_cache: 目標班別 → 已編碼的候選人清單 JSON，名冊變動時清空
+    讀取時以儲存後端的簽章（CSV 為 mtime/size）檢查是否被外部修改，寫入路徑則直接就地更新
+    跨行程計數（SharedVersions）沒變時不必檢查簽章；手動修改檔案則最多 STATE_CHECK_INTERVAL 秒後發現
+    """
+
+    def __init__(self, year, month):
+        self.year = year
+        self.month = month
+        self.lock = threading.RLock()
+        self.employees = EmployeeRegistry()
+        self.voter_shifts = {}
+        self.votes_used = {}
+        self.votes = []
+        self.tallies = {}
+        self.vote_index = {field: {} for field in VOTE_INDEX_FIELDS}
+        self.rollup = {
+            'headcount': {'RR': 0, '輪班': 0},
+            'voters': {'RR': 0, '輪班': 0},
+            'ballots': {'RR': 0, '輪班': 0},
+        }
+        self.vote_log = []        # 尚未合併的增量記錄
+        self.base = {'employees': [], 'monthly_votes': []}   # [EmployeeRecord] / [(emp_id, 班別代碼, 已用票數)]
+        self.signatures = {}
+        self.version = 0
+        self.roster_digest = None    # 名冊（工號 / 姓名 / 班別，依名冊順序）的雜湊
+        self.roster_version = 0
+        self.candidate_cache = {}
+        self.shared_version = None   # 上次檢查簽章時的跨行程計數
+        self.checked_at = 0.0
+        self._columns = None         # vote_columns 的快取：(來源記錄列表, VoteColumns, 人員索引, 班別索引)
+
+    def refresh(self):
+        """
+        只重新載入簽章有變動的資料
+        shared_version 在載入完成後才更新：快速路徑不取鎖，提早更新會讓並行請求讀到載入一半的月份
+        """
+        shared = shared_versions().get(self.year, self.month)
+        if shared == self.shared_version and time.monotonic() - self.checked_at < STATE_CHECK_INTERVAL:
+            return
+        with self.lock:
+            for kind in TABLE_FIELDS:
+                sig = storage.signature(self.year, self.month, kind)
+                if kind in self.signatures and self.signatures[kind] == sig:
+                    metrics.inc('vote_cache_requests_total', cache='month_state', result='hit')
+                    continue
+                metrics.inc('vote_cache_requests_total', cache='month_state', result='miss')
+                self.set_rows(kind, storage.read(self.year, self.month, kind))
+                self.signatures[kind] = sig
+                logger.debug(f"🔄 載入 {self.year}/{self.month} {kind} 到記憶體")
+            # 載入完成後才記錄版本，避免並行請求略過檢查而讀到尚未載入的資料
+            self.shared_version = shared
+            self.checked_at = time.monotonic()
+
+    def set_rows(self, kind, rows):
+        """以整份資料取代指定類型的內容"""
+        self.version += 1
+        if kind == 'votes' and isinstance(self.votes, VoteArchive) and self.votes is not rows:
+            self.votes.close()
+        if kind == 'votes' and isinstance(rows, VoteArchive):
+            self._load_archive(rows)
+            vote_stats_publisher.notify_reset((self.year, self.month))
+            return
+        if kind == 'employees':
+            self.base[kind] = [EmployeeRecord.from_row(row) for row in rows]
+            self._derive_employees()
+            return
+        if kind == 'monthly_votes':
+            self.base[kind] = [self._parse_monthly_vote(row) for row in rows]
+            self._derive_monthly_votes()
+            return
+        rows = [dict(row) for row in rows]
+        if kind == 'votes':
+            self.votes = rows
+            self.tallies = {'2000': RankedTally(), 'other': RankedTally(), 'all': RankedTally()}
+            self.rollup['ballots'] = {'RR': 0, '輪班': 0}
+            self.vote_index = {field: {} for field in VOTE_INDEX_FIELDS}
+            for pos, row in enumerate(rows):
+                self._count_vote(row)
+                self._index_vote(pos, row)
+            vote_stats_publisher.notify_reset((self.year, self.month))
+            return
+        self.vote_log = rows
+        self._derive_employees()
+        self._derive_monthly_votes()
+
+    def append_rows(self, kind, rows):
+        """
+        追加多筆資料
+        名冊與月度統計整批加入後只重新推導一次（逐筆追加會使每筆都重建整份名冊）
+        """
+        if kind == 'employees':
+            self.version += 1
+            self.base[kind].extend(EmployeeRecord.from_row(row) for row in rows)
+            self._derive_employees()
+        elif kind == 'monthly_votes':
+            self.version += 1
+            self.base[kind].extend(self._parse_monthly_vote(row) for row in rows)
+            self._derive_monthly_votes()
+        else:
+            for row in rows:
+                self.append_row(kind, row)
+
+    def append_row(self, kind, row):
+        """追加單筆資料"""
+        self.version += 1
+        row = dict(row)
+        if kind == 'votes':
+            if not isinstance(self.votes, list):
+                self.votes = list(self.votes)
+            self.votes.append(row)
+            group = self._count_vote(row)
+            self._index_vote(len(self.votes) - 1, row)
+            vote_stats_publisher.notify((self.year, self.month), group, row['voted_for_emp_id'])
+        elif kind == 'vote_log':
+            self.vote_log.append(row)
+            self._apply_log_entry(row)
+        elif kind == 'employees':
+            self.base[kind].append(EmployeeRecord.from_row(row))
+            self._derive_employees()
+        else:
+            self.base[kind].append(self._parse_monthly_vote(row))
+            self._derive_monthly_votes()
+
+    def candidates_json(self, target_shift):
+        """指定班別的候選人清單，回傳已編碼的 JSON；同月同班別的投票者共用"""
+        with self.lock:
+            encoded = self.candidate_cache.get(target_shift)
+            metrics.inc('vote_cache_requests_total', cache='candidates', result='miss' if encoded is None else 'hit')
+            if encoded is None:
+                encoded = app.json.dumps([
+                    {'emp_id': emp.emp_id, 'name': emp.name, 'shift_type': emp.display_shift}
+                    for emp in self.base['employees']
+                    if emp.display_shift == target_shift
+                ]).encode('utf-8')
+                self.candidate_cache[target_shift] = encoded
+            return encoded
+
+    def iter_votes(self, filters=None, after=None):
+        """
+        依序產生符合條件的 (索引, 投票記錄)
+        filters: {欄位: 值}，由 vote_index 取出最小的候選集合，不掃描整月記錄
+        after: 游標，只回傳索引大於此值的記錄
+        只涵蓋呼叫當下已存在的記錄；產生途中被重置也不受影響
+        """
+        filters = filters or {}
+        with self.lock:
+            rows = self.votes
+            end = len(rows)
+            positions = None
+            for field, value in filters.items():
+                indexed = self.vote_index[field].get(value, [])
+                if positions is None or len(indexed) < len(positions):
+                    positions = indexed
+            # 封存檔在產生途中被關閉時，延到產生結束才釋放
+            archive = rows if isinstance(rows, VoteArchive) else None
+            if archive is not None:
+                archive.pin()
+
+        try:
+            # 負數游標會變成從尾端倒數的索引，視同從頭開始
+            start = 0 if after is None else max(after + 1, 0)
+            if positions is None:
+                candidates = range(start, end)
+            else:
+                candidates = itertools.islice(positions, bisect.bisect_left(positions, start), None)
+
+            for pos in candidates:
+                if pos >= end:
+                    break
+                row = rows[pos]
+                if all(row.get(field) == value for field, value in filters.items()):
+                    yield pos, row
+        finally:
+            if archive is not None:
+                archive.unpin()
+
+    def vote_columns(self):
+        """
+        投票記錄的整數欄位（VoteColumns），供跨月分析
+        封存月份複製封存檔的欄位；其他月份快取轉換結果，新追加的記錄只轉換增加的部分
+        回傳的是當下的複本，之後的追加或封存檔關閉不影響
+        """
+        with self.lock:
+            votes = self.votes
+            if isinstance(votes, VoteArchive):
+                return VoteColumns(list(votes.people), list(votes.shifts), *(
+                    array(typecode, column.tobytes()) for typecode, column in zip('IIBB', (
+                        votes.voters, votes.candidates, votes.voter_shifts, votes.candidate_shifts))
+                ))
+
+            if self._columns is None or self._columns[0] is not votes:
+                columns = VoteColumns([], [], array('I'), array('I'), array('H'), array('H'))
+                self._columns = (votes, columns, {}, {})
+            _, columns, people, shifts = self._columns
+
+            def person(emp_id, name):
+                index = people.get((emp_id, name))
+                if index is None:
+                    index = people[(emp_id, name)] = len(columns.people)
+                    columns.people.append((emp_id, name))
+                return index
+
+            def shift(value):
+                index = shifts.get(value)
+                if index is None:
+                    index = shifts[value] = len(columns.shifts)
+                    columns.shifts.append(value)
+                return index
+
+            for row in itertools.islice(votes, len(columns.voters), None):
+                columns.voters.append(person(row['voter_emp_id'], row.get('voter_name')))
+                columns.candidates.append(person(row['voted_for_emp_id'], row.get('voted_for_name')))
+                columns.voter_shifts.append(shift(row.get('voter_shift')))
+                columns.candidate_shifts.append(shift(row.get('voted_for_shift')))
+
+            return VoteColumns(list(columns.people), list(columns.shifts), *(
+                column[:] for column in columns[2:]
+            ))
+
+    def _load_archive(self, archive):
+        """
+        由封存檔的整數欄位直接計算排行、投票數彙總與索引
+        投票記錄保留為封存檔本身，/api/votes 取值時才組出資料列
+        """
+        self.votes = archive
+        people, shifts = archive.people, archive.shifts
+
+        # (候選人, 班別) 依首次出現的順序計數，再合併為各分組以工號為鍵的排行
+        groups = {'2000': {}, 'other': {}, 'all': {}}
+        for (candidate, code), count in Counter(zip(archive.candidates, archive.candidate_shifts)).items():
+            vid, name = people[candidate]
+            shift = shifts[code]
+            group_key = '2000' if shift == '2000' else 'other'
+            groups[group_key].setdefault(vid, {
+                'emp_id': vid, 'name': name, 'vote_count': 0, 'shift_type': shift
+            })['vote_count'] += count
+            groups['all'].setdefault(vid, {
+                'emp_id': vid, 'name': name, 'shift_type': normalize_shift(shift), 'vote_count': 0
+            })['vote_count'] += count
+        self.tallies = {key: RankedTally.from_counts(entries.items()) for key, entries in groups.items()}
+
+        self.rollup['ballots'] = {'RR': 0, '輪班': 0}
+        for code, count in Counter(archive.voter_shifts).items():
+            self._bump_rollup('ballots', shifts[code], count)
+
+        self.vote_index = {}
+        for field, column, labels in (
+            ('voter_emp_id', archive.voters, [emp_id for emp_id, _ in people]),
+            ('voted_for_emp_id', archive.candidates, [emp_id for emp_id, _ in people]),
+            ('voter_shift', archive.voter_shifts, shifts),
+        ):
+            positions = {}
+            for pos, value in enumerate(column):
+                positions.setdefault(value, []).append(pos)
+            index = {}
+            for value, found in positions.items():
+                # 同一工號可能對應多個人員（月中改名），合併後保持遞增
+                merged = index.get(labels[value])
+                index[labels[value]] = found if merged is None else sorted(merged + found)
+            self.vote_index[field] = index
+
+    def _index_vote(self, pos, row):
+        for field, index in self.vote_index.items():
+            index.setdefault(row.get(field), []).append(pos)
+
+    def rollup_snapshot(self):
+        """彙總的複本"""
+        return {key: dict(counts) for key, counts in self.rollup.items()}
+
+    def _bump_rollup(self, key, shift_type, delta=1):
+        shift = normalize_shift(shift_type)
+        if shift in self.rollup[key]:
+            self.rollup[key][shift] += delta
+
+    def _count_vote(self, row):
+        """計入一筆投票，回傳所屬的分組排行（'2000' / 'other'）"""
+        self._bump_rollup('ballots', row.get('voter_shift'))
+
+        vid = row['voted_for_emp_id']
+        shift = row.get('voted_for_shift')  # 2000 or 3000
+
+        group_key = '2000' if shift == '2000' else 'other'
+        self.tallies[group_key].add(vid, lambda: {
+            'emp_id': vid,
+            'name': row['voted_for_name'],
+            'vote_count': 0,
+            'shift_type': shift  # ★ 回傳數字
+        })
+        self.tallies['all'].add(vid, lambda: {
+            'emp_id': vid,
+            'name': row['voted_for_name'],
+            # 統一輸出 RR / 輪班
+            'shift_type': normalize_shift(row['voted_for_shift']),
+            'vote_count': 0
+        })
+        return group_key
+
+    def monthly_votes_rows(self):
+        """目前的票數（已套用增量記錄）轉回 monthly_votes.csv 的資料列"""
+        year_month = f"{self.year}{self.month:02d}"
+        return [
+            {
+                'emp_id': emp_id,
+                'year_month': year_month,
+                'shift_type': shift_codes.raw[shift],
+                'votes_used': str(self.votes_used[emp_id])
+            }
+            for emp_id, shift in self.voter_shifts.items()
+        ]
+
+    @staticmethod
+    def _parse_monthly_vote(row):
+        return row['emp_id'], shift_codes.code(row.get('shift_type') or ''), int(row.get('votes_used') or 0)
+
+    def _count_shifts(self, key, shifts):
+        """以班別代碼的出現次數重算彙總"""
+        self.rollup[key] = {'RR': 0, '輪班': 0}
+        for shift, count in Counter(shifts).items():
+            self._bump_rollup(key, shift_codes.display[shift], count)
+
+    def _derive_employees(self):
+        self.employees = EmployeeRegistry(self.base['employees'])
+        for entry in self.vote_log:
+            self._apply_voter_flag(entry)
+
+        self._count_shifts('headcount', (emp.shift for emp in self.employees.values()))
+
+        # 投票旗標的變動（合併增量記錄時重寫 employees）不影響候選人清單
+        digest = hashlib.sha1()
+        for emp in self.base['employees']:
+            digest.update(f"{emp.emp_id}\x1f{emp.name}\x1f{emp.display_shift}\x1e".encode('utf-8'))
+        digest = digest.digest()
+        if digest != self.roster_digest:
+            self.roster_digest = digest
+            self.roster_version += 1
+            self.candidate_cache = {}
+
+    def _derive_monthly_votes(self):
+        self.voter_shifts = {}
+        self.votes_used = {}
+        for emp_id, shift, votes_used in self.base['monthly_votes']:
+            self.voter_shifts[emp_id] = shift
+            self.votes_used[emp_id] = votes_used
+
+        self._count_shifts('voters', (
+            shift for emp_id, shift in self.voter_shifts.items() if self.votes_used[emp_id] > 0
+        ))
+
+        for entry in self.vote_log:
+            self._apply_counter(entry)
+
+    def _apply_log_entry(self, entry):
+        self._apply_counter(entry)
+        self._apply_voter_flag(entry)
+
+    def _apply_counter(self, entry):
+        # 增量記錄保存的是投票後的絕對票數，重複套用結果相同
+        emp_id = entry['emp_id']
+        shift = self.voter_shifts.get(emp_id)
+        if shift is None:
+            shift = self.voter_shifts[emp_id] = shift_codes.code(entry['shift_type'] or '')
+
+        old_used = self.votes_used.get(emp_id, 0)
+        new_used = int(entry['votes_used'])
+        self.votes_used[emp_id] = new_used
+        if old_used <= 0 < new_used:
+            self._bump_rollup('voters', shift_codes.display[shift])
+        elif new_used <= 0 < old_used:
+            self._bump_rollup('voters', shift_codes.display[shift], -1)
+
+    def _apply_voter_flag(self, entry):
+        emp = self.employees.get(entry['emp_id'])
+        if emp is None:
+            return
+        self.employees.replace(emp.voted(entry['last_vote_time']))
+
+
+# 投票記錄的整數欄位：人員 [(工號, 姓名)] 與班別以索引表示
+VoteColumns = namedtuple('VoteColumns', 'people shifts voters candidates voter_shifts candidate_shifts')
+
+
+STATE_CHECK_INTERVAL = 1.0    # 跨行程計數沒變時，多久檢查一次簽章（察覺手動修改）
+
+# 本月常駐記憶體；其他月份只保留最近使用的幾個，避免查詢 / 分析 / 匯出碰過的月份永遠留在每個 worker
+MONTH_STATE_CACHE = config.getint('SYSTEM', 'month_state_cache', fallback=3)
+
+_month_states = OrderedDict()   # (year, month) → MonthState，依最近使用排序
+_month_states_lock = threading.Lock()
+
+
+def get_month_state(year=None, month=None):
+    """取得指定月份的記憶體狀態（必要時載入或重新載入）"""
+    if year is None or month is None:
+        now = datetime.now()
+        year = now.year
+        month = now.month
+
+    key = (int(year), int(month))
+    with _month_states_lock:
+        state = _month_states.get(key)
+        if state is None:
+            state = MonthState(*key)
+            _month_states[key] = state
+            _evict_month_states()
+        else:
+            _month_states.move_to_end(key)
+
+    state.refresh()
+    return state
+
+
+def _evict_month_states():
+    """
+    移除最久未使用的過去月份，只留 MONTH_STATE_CACHE 個（呼叫端須持有 _month_states_lock）
+    仍持有被移除狀態的呼叫端可以繼續使用；之後的寫入找不到狀態就不同步，下次讀取時重新載入
+    """
+    now = datetime.now()
+    past = [key for key in _month_states if key != (now.year, now.month)]
+    for key in past[:max(0, len(past) - MONTH_STATE_CACHE)]:
+        del _month_states[key]
+        logger.debug(f"🧹 {key[0]}/{key[1]} 移出記憶體")
+
+
+def _release_vote_archive(year, month):
+    """
+    刪除或覆寫封存檔前呼叫：記憶體中的月份狀態改持有一般列表，並關閉原本的封存檔
+    被移出快取的狀態不在此列，其封存檔隨物件回收而關閉
+    """
+    state = _month_states.get((int(year), int(month)))
+    if state is None:
+        return
+    with state.lock:
+        archive = state.votes
+        if not isinstance(archive, VoteArchive):
+            return
+        state.votes = list(archive)
+    archive.close()
+
+
+def _sync_state_after_write(year, month, kind, before, rows=None, appended=None):
+    """
+    寫入後同步記憶體狀態並通知其他行程
+    before: 寫入前的簽章；若與記憶體中的不一致代表資料曾被外部修改，改為下次重新載入
+    """
+    shared_before, shared_after = shared_versions().bump(year, month)
+    state = _month_states.get((int(year), int(month)))
+    if state is None:
+        return
+    with state.lock:
+        # 計數只因本次寫入而改變時，本行程的狀態已是最新
+        if state.shared_version == shared_before:
+            state.shared_version = shared_after
+        if rows is not None:
+            state.set_rows(kind, rows)
+        elif state.signatures.get(kind, 'unloaded') == before:
+            state.append_rows(kind, appended)
+        else:
+            state.signatures.pop(kind, None)
+            state.shared_version = None
+            return
+        state.signatures[kind] = storage.signature(state.year, state.month, kind)
+
+
+# 經由儲存後端寫入並同步記憶體狀態
+def write_table(year, month, kind, rows):
+    """以整份資料取代指定月份的資料表"""
+    storage.write(year, month, kind, rows)
+    _sync_state_after_write(year, month, kind, None, rows=rows)
+
+def append_table(year, month, kind, rows):
+    """追加多筆資料到指定月份的資料表（單次寫入）"""
+    before = storage.signature(year, month, kind)
+    storage.append(year, month, kind, rows)
+    _sync_state_after_write(year, month, kind, before, appended=rows)
+
+def remove_table(year, month, kind):
+    """刪除指定月份的資料表"""
+    storage.remove(year, month, kind)
+    _sync_state_after_write(year, month, kind, None, rows=[])
+
+
+# 寫入鎖
+class MonthWriteLock:
+    """
+    月份寫入鎖（可重入）
+    行程內以 RLock 互斥，跨行程再以 fcntl 鎖住月份目錄下的 .lock 檔
+    """
+
+    def __init__(self, lock_path):
+        self.lock_path = lock_path
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+        self._pid = None
+        self.users = 0      # 持有或等待中的數量（由 month_write_lock 維護）
+
+    def __enter__(self):
+        self._lock.acquire()
+        try:
+            if self._depth == 0 and fcntl is not None:
+                # fork 後的子行程須重新開檔，共用同一個檔案描述會使 flock 失效
+                if self._fd is None or self._pid != os.getpid():
+                    self.lock_path.parent.mkdir(parents=True, exist_ok=True)
+                    self._fd = open(self.lock_path, 'a')
+                    self._pid = os.getpid()
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+        except Exception:
+            self._lock.release()
+            raise
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc_info):
+        self._depth -= 1
+        if self._depth == 0 and self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._lock.release()
+
+    def close(self):
+        """關閉鎖檔（沒有人持有時才可呼叫）"""
+        if self._fd is not None:
+            self._fd.close()
+            self._fd = None
+
+
+# 鎖只在有人持有或等待時留在表中，最後一個使用者離開就移除，避免每個 worker 累積月份 × 名冊人數個鎖
+_month_write_locks = {}     # (year, month) → MonthWriteLock
+_voter_locks = {}           # (year, month, emp_id) → [Lock, 持有或等待中的數量]
+_locks_guard = threading.Lock()
+
+
+@contextmanager
+def month_write_lock(year, month):
+    """月份寫入鎖，所有會修改該月份檔案的流程都應持有（可重入）"""
+    key = (int(year), int(month))
+    with _locks_guard:
+        lock = _month_write_locks.get(key)
+        if lock is None:
+            lock = MonthWriteLock(get_month_dir(*key) / '.lock')
+            _month_write_locks[key] = lock
+        lock.users += 1
+    try:
+        with lock:
+            yield lock
+    finally:
+        with _locks_guard:
+            lock.users -= 1
+            if lock.users == 0:
+                del _month_write_locks[key]
+                lock.close()
+
+
+@contextmanager
+def voter_lock(year, month, emp_id):
+    """同一投票者同時間只允許一筆投票在處理"""
+    key = (int(year), int(month), emp_id)
+    with _locks_guard:
+        entry = _voter_locks.get(key)
+        if entry is None:
+            entry = _voter_locks[key] = [threading.Lock(), 0]
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _locks_guard:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del _voter_locks[key]
+
+
+# 配置快照
+ConfigSnapshot = namedtuple('ConfigSnapshot', ['version', 'signature', 'quotas', 'digest'])
+
+# 兩次檢查 config.ini 是否變動的最短間隔（秒）
+CONFIG_CHECK_INTERVAL = 1.0
+
+
+def _load_config_snapshot(version):
+    """讀取 config.ini 建立新的快照"""
+    parser = configparser.ConfigParser()
+    signature = file_signature(CONFIG_FILE)
+    parser.read(CONFIG_FILE, encoding='utf-8')
+    quotas = {
+        '2000': parser.getint('VOTE_QUOTAS', 'quota_2000', fallback=3),   # ← key 改用 '2000'
+        '3000': parser.getint('VOTE_QUOTAS', 'quota_3000', fallback=2)    # ← key 改用 '3000'
+    }
+    digest = hashlib.sha1(json.dumps(quotas, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+    return ConfigSnapshot(version, signature, MappingProxyType(quotas), digest)
+
+
+_config_snapshot = _load_config_snapshot(1)
+_config_checked_at = time.monotonic()
+_config_lock = threading.Lock()
+
+
+def get_config(force=False):
+    """
+    取得目前的配置快照
+    只有 config.ini 的 mtime/size 改變（或 force）時才重新解析並遞增 version
+    """
+    global _config_snapshot, _config_checked_at
+
+    now = time.monotonic()
+    if not force and now - _config_checked_at < CONFIG_CHECK_INTERVAL:
+        return _config_snapshot
+
+    with _config_lock:
+        _config_checked_at = now
+        snapshot = _config_snapshot
+        if force or file_signature(CONFIG_FILE) != snapshot.signature:
+            snapshot = _load_config_snapshot(snapshot.version + 1)
+            _config_snapshot = snapshot
+            logger.info(f"⚙️ 已載入配置 v{snapshot.version}: {dict(snapshot.quotas)}")
+    return snapshot
+
+
+def config_version():
+    """
+    目前配置內容的雜湊，供以配置為鍵的快取與 ETag 判斷是否失效
+    snapshot.version 只在本行程內遞增；雜湊由內容決定，各 worker 相同內容得到相同的值
+    """
+    return get_config().digest
+
+
 # 獲取配額
 def get_quota():
-    """從 INI 文件讀取配額設定（2000/3000 班別）"""
-    config.read('config.ini', encoding='utf-8')
-    quota_2000 = config.getint('VOTE_QUOTAS', 'quota_2000', fallback=3)
-    quota_3000 = config.getint('VOTE_QUOTAS', 'quota_3000', fallback=2)
-    return {
-        '2000': quota_2000,   # ← key 改用 '2000'
-        '3000': quota_3000    # ← key 改用 '3000'
-    }
+    """取得配額設定（2000/3000 班別），來自記憶體中的配置快照"""
+    return dict(get_config().quotas)
 
 # 更新配額設定
 def update_quota(quota_2000, quota_3000):
-    """更新 INI 中的配額設定"""
-    config.read('config.ini', encoding='utf-8')
-    config.set('VOTE_QUOTAS', 'quota_2000', str(quota_2000))
-    config.set('VOTE_QUOTAS', 'quota_3000', str(quota_3000))
-    with open('config.ini', 'w', encoding='utf-8') as f:
-        config.write(f)
+    """更新 INI 中的配額設定，寫入後立即發布新的配置快照"""
+    global _config_snapshot, _config_checked_at
+
+    with _config_lock:
+        parser = configparser.ConfigParser()
+        parser.read(CONFIG_FILE, encoding='utf-8')
+        if not parser.has_section('VOTE_QUOTAS'):
+            parser.add_section('VOTE_QUOTAS')
+        parser.set('VOTE_QUOTAS', 'quota_2000', str(quota_2000))
+        parser.set('VOTE_QUOTAS', 'quota_3000', str(quota_3000))
+
+        tmp_path = CONFIG_FILE.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            parser.write(f)
+        os.replace(tmp_path, CONFIG_FILE)
+
+        _config_snapshot = _load_config_snapshot(_config_snapshot.version + 1)
+        _config_checked_at = time.monotonic()
+        logger.info(f"⚙️ 配額已更新,配置 v{_config_snapshot.version}")
+
+# 批次取得本月所有員工已用票數
+def get_monthly_votes_map(year=None, month=None):
+    """
+    回傳 emp_id → votes_used 的字典（一次建立，供批次查詢）
+    注意：回傳的是共用的記憶體索引，請勿修改
+    """
+    return get_month_state(year, month).votes_used
 
 # 獲取或創建員工本月投票記錄
 def get_or_create_monthly_votes(emp_id, shift_type, year=None, month=None):
     """獲取員工本月已使用的票數"""
+    return get_monthly_votes_map(year, month).get(emp_id, 0)  # 如果不存在，返回 0
+
+# 記錄一次投票（增量記錄）
+def record_ballots(ballots, year=None, month=None):
+    """
+    以增量記錄更新多張選票的已用票數與投票旗標（單次追加，每位投票者一行）
+    ballots: [(emp_id, shift_type, 票數, 投票時間)]，呼叫前投票記錄須已寫入 yyyymm.csv
+    呼叫端須持有 month_write_lock（commit_ballots / update_monthly_votes）
+    回傳 emp_id → 更新後的已用票數
+    """
     if year is None or month is None:
         now = datetime.now()
         year = now.year
         month = now.month
-    
-    monthly_votes_file = get_monthly_votes_file(year, month)
-    monthly_votes = read_csv(monthly_votes_file)
-    
-    for record in monthly_votes:
-        if record['emp_id'] == emp_id:
-            return int(record['votes_used'])
-    
-    return 0  # 如果不存在，返回 0
+
+    # ✅ 統計檔與增量記錄都不存在時,從投票記錄重建（已包含本批投票）
+    rebuilt = not storage.exists(year, month, 'monthly_votes') and not storage.exists(year, month, 'vote_log')
+    if rebuilt:
+        logger.warning(f"⚠️ monthly_votes.csv 不存在於 {year}/{month},嘗試重建...")
+        rebuild_monthly_votes_from_records(year, month)
+    votes_map = get_monthly_votes_map(year, month)
+
+    used = {}
+    entries = {}
+    for emp_id, shift_type, count, vote_time in ballots:
+        if rebuilt:
+            used[emp_id] = votes_map.get(emp_id, 0)
+        else:
+            used[emp_id] = used.get(emp_id, votes_map.get(emp_id, 0)) + count
+        entries[emp_id] = {
+            'emp_id': emp_id,
+            'shift_type': shift_type,
+            'votes_used': str(used[emp_id]),
+            'last_vote_time': vote_time
+        }
+
+    append_table(year, month, 'vote_log', list(entries.values()))
+    for emp_id, votes_used in used.items():
+        logger.info(f"📊 更新票數：{emp_id} → {votes_used}")
+
+    if len(get_month_state(year, month).vote_log) >= VOTE_LOG_COMPACT_THRESHOLD:
+        compact_vote_log(year, month)
+
+    return used
+
+
+def record_ballot(emp_id, shift_type, count, vote_time, year=None, month=None):
+    """
+    以一行增量記錄更新投票者的已用票數與投票旗標，回傳更新後的已用票數
+    呼叫前投票記錄須已寫入 yyyymm.csv；呼叫端須持有 month_write_lock
+    """
+    return record_ballots([(emp_id, shift_type, count, vote_time)], year, month)[emp_id]
+
 
 # 更新每月投票計數
 def update_monthly_votes(emp_id, shift_type, year=None, month=None):
-    """更新員工本月投票計數"""
+    """更新員工本月投票計數（+1），自行持有月份寫入鎖（可重入，呼叫端已持有也可以）"""
     if year is None or month is None:
         now = datetime.now()
         year = now.year
         month = now.month
-    
-    monthly_votes_file = get_monthly_votes_file(year, month)
-    
-    # ✅ 新增: 如果檔案不存在,嘗試從投票記錄重建
-    if not monthly_votes_file.exists():
-        logger.warning(f"⚠️ monthly_votes.csv 不存在於 {year}/{month},嘗試重建...")
-        rebuild_monthly_votes_from_records(year, month)
-        logger.info(f"✅ 重建完成，直接返回避免重複計數")
-        return  # ← ⭐ 關鍵修改：重建後直接返回
-    
-    monthly_votes = read_csv(monthly_votes_file)
-    found = False
-    old_votes = 0
-    
-    for record in monthly_votes:
-        if record['emp_id'] == emp_id:
-            old_votes = int(record['votes_used'])
-            record['votes_used'] = str(old_votes + 1)
-            found = True
-            logger.info(f"📊 更新票數：{emp_id} 從 {old_votes} → {record['votes_used']}")
-            break
-    
-    if not found:
-        monthly_votes.append({
-            'emp_id': emp_id,
-            'year_month': f"{year}{month:02d}",
-            'shift_type': shift_type,
-            'votes_used': '1'
-        })
-        logger.info(f"🆕 新增投票記錄：{emp_id} 始票數 1")
-    
-    write_csv(monthly_votes_file, monthly_votes, ['emp_id', 'year_month', 'shift_type', 'votes_used'])
+
+    with month_write_lock(year, month):
+        record_ballot(emp_id, shift_type, 1, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), year, month)
+
+
+# 合併增量記錄
+def compact_vote_log(year=None, month=None):
+    """將增量記錄合併回 monthly_votes.csv 與 employees.csv，再刪除增量記錄"""
+    state = get_month_state(year, month)
+
+    with month_write_lock(state.year, state.month):
+        state.refresh()
+        if not state.vote_log:
+            return False
+
+        # 增量記錄存的是絕對值，合併途中中斷也可安全重播
+        write_table(state.year, state.month, 'monthly_votes', state.monthly_votes_rows())
+        if state.employees:
+            write_table(state.year, state.month, 'employees', [emp.as_row() for emp in state.employees.values()])
+        merged = len(state.vote_log)
+        remove_table(state.year, state.month, 'vote_log')
+
+    logger.info(f"🗜️ 已合併 {state.year}/{state.month} 的 {merged} 筆增量記錄")
+    return True
 
 
 def rebuild_monthly_votes_from_records(year=None, month=None):
@@ -187,8 +2003,15 @@ def rebuild_monthly_votes_from_records(year=None, month=None):
         year = now.year
         month = now.month
     
-    vote_file = get_month_file(year, month)
-    votes = read_csv(vote_file)
+    with month_write_lock(year, month):
+        return _rebuild_monthly_votes_locked(year, month)
+
+
+def _rebuild_monthly_votes_locked(year, month):
+    # 先把投票旗標合併回 employees.csv，票數則以投票記錄為準
+    compact_vote_log(year, month)
+
+    votes = get_month_state(year, month).votes
     
     if not votes:
         logger.info(f"📊 {year}/{month} 無投票記錄,無需重建")
@@ -215,9 +2038,8 @@ def rebuild_monthly_votes_from_records(year=None, month=None):
             'votes_used': str(count)
         })
     
-    monthly_votes_file = get_monthly_votes_file(year, month)
-    write_csv(monthly_votes_file, monthly_votes, 
-              ['emp_id', 'year_month', 'shift_type', 'votes_used'])
+    write_table(year, month, 'monthly_votes', monthly_votes)
+    close_month(year, month)
     
     logger.info(f"✅ 成功重建 {year}/{month} 月度統計,共 {len(monthly_votes)} 筆記錄")
     return True
@@ -225,74 +2047,324 @@ def rebuild_monthly_votes_from_records(year=None, month=None):
 
 
 
+# 封存已結束的月份
+def archive_month(year, month):
+    """
+    將已結束月份的投票記錄轉為封存檔（見 VoteArchive），回傳封存筆數
+    本月、沒有投票記錄或無法無損轉換的月份不封存，回傳 None
+    """
+    now = datetime.now()
+    if (year, month) >= (now.year, now.month):
+        logger.warning(f"⚠️ {year}/{month} 尚未結束,不封存")
+        return None
+
+    with month_write_lock(year, month):
+        archived = storage.archive(year, month)
+        if archived is None:
+            return None
+        _sync_state_after_write(year, month, 'votes', None, rows=storage.read(year, month, 'votes'))
+    close_month(year, month)
+
+    logger.info(f"🗄️ 已封存 {year}/{month} 的 {archived} 筆投票記錄")
+    return archived
+
+
+# 月份彙總
+def _rollup_signature(year, month):
+    """彙總所依據的資料版本（JSON 化後可直接比對）"""
+    return json.loads(json.dumps([storage.signature(year, month, kind) for kind in TABLE_FIELDS]))
+
+
+def scan_month_rollup(year, month):
+    """
+    不建立 MonthState，逐筆掃描儲存的資料計算彙總（結果與 MonthState.rollup 相同）
+    只保留每位投票者的已用票數，不保留投票記錄
+    """
+    rollup = {key: {'RR': 0, '輪班': 0} for key in ('headcount', 'voters', 'ballots')}
+
+    def bump(key, shift_type):
+        shift = normalize_shift(shift_type)
+        if shift in rollup[key]:
+            rollup[key][shift] += 1
+
+    for row in storage.iter_rows(year, month, 'employees'):
+        bump('headcount', row.get('shift_type') or '')
+
+    # 增量記錄保存投票後的絕對票數，以最後一筆為準；班別以 monthly_votes 為準
+    voter_shifts, votes_used = {}, {}
+    for row in storage.iter_rows(year, month, 'monthly_votes'):
+        voter_shifts[row['emp_id']] = row.get('shift_type') or ''
+        votes_used[row['emp_id']] = int(row.get('votes_used') or 0)
+    for entry in storage.iter_rows(year, month, 'vote_log'):
+        voter_shifts.setdefault(entry['emp_id'], entry['shift_type'] or '')
+        votes_used[entry['emp_id']] = int(entry['votes_used'])
+    for emp_id, used in votes_used.items():
+        if used > 0:
+            bump('voters', voter_shifts[emp_id])
+
+    for row in storage.iter_rows(year, month, 'votes'):
+        bump('ballots', row.get('voter_shift'))
+    return rollup
+
+
+def _current_rollup(year, month):
+    """已在記憶體的月份直接取增量維護的彙總，否則逐筆掃描，不載入整月資料"""
+    state = _month_states.get((int(year), int(month)))
+    if state is None:
+        return scan_month_rollup(year, month)
+    state.refresh()
+    with state.lock:
+        return state.rollup_snapshot()
+
+
+def close_month(year, month):
+    """計算並保存月份彙總（月份結束或重建後呼叫），回傳彙總"""
+    # 完全沒有資料的月份不保存，也不建立目錄
+    if all(sig is None for sig in _rollup_signature(year, month)):
+        rollup = _current_rollup(year, month)
+        rollup['signature'] = _rollup_signature(year, month)
+        return rollup
+
+    with month_write_lock(year, month):
+        rollup = _current_rollup(year, month)
+        rollup['signature'] = _rollup_signature(year, month)
+        storage.write_rollup(year, month, rollup)
+    return rollup
+
+
+def get_month_rollup(year, month):
+    """
+    取得月份彙總
+    當月直接取記憶體中增量維護的彙總；歷史月份讀取已保存的彙總，資料變動過才重新計算
+    """
+    now = datetime.now()
+    if (year, month) == (now.year, now.month):
+        state = get_month_state(year, month)
+        with state.lock:
+            return state.rollup_snapshot()
+
+    saved = storage.read_rollup(year, month)
+    if saved is not None and saved.get('signature') == _rollup_signature(year, month):
+        return saved
+    return close_month(year, month)
+
+
 # 從 JSON 載入員工資料到當前月份
-def load_employees_from_json(year=None, month=None):
-    """從 emoinfo.json 載入員工資料到指定月份的 employees.csv"""
+# 名冊匯入
+ROSTER_REQUIRED_FIELDS = ('工號', '姓名', '班別')
+ROSTER_SHIFT_MAP = {     # 班別轉換表(統一成 2000 / 3000)
+    'RR': '2000',
+    '輪班': '3000',
+    '2000': '2000',
+    '3000': '3000'
+}
+ROSTER_CHUNK_SIZE = 1 << 16
+
+
+def iter_json_array(f, chunk_size=ROSTER_CHUNK_SIZE):
+    """逐筆解析 JSON 陣列的元素，一次只保留一個區塊在記憶體"""
+    decoder = json.JSONDecoder()
+    buf, pos, eof = '', 0, False
+
+    def fill():
+        nonlocal buf, pos, eof
+        chunk = f.read(chunk_size)
+        buf, pos, eof = buf[pos:] + chunk, 0, not chunk
+
+    def peek():
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos].isspace():
+                pos += 1
+            if pos < len(buf):
+                return buf[pos]
+            if eof:
+                return ''
+            fill()
+
+    if peek() != '[':
+        raise json.JSONDecodeError('必須是陣列格式', buf, pos)
+    pos += 1
+    if peek() == ']':
+        return
+
+    while True:
+        peek()
+        while True:
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+                # 數值可能被區塊切斷，結尾剛好在區塊邊界時再讀一塊確認
+                if end < len(buf) or eof:
+                    break
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            fill()
+        pos = end
+        yield value
+
+        separator = peek()
+        pos += 1
+        if separator == ']':
+            return
+        if separator != ',':
+            raise json.JSONDecodeError('陣列元素之間缺少逗號', buf, pos - 1)
+
+
+def _hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(ROSTER_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _read_roster(source):
+    """
+    串流讀取並驗證名冊（單次走訪），回傳 emp_id → (姓名, 班別)
+    有缺欄位的資料時整份放棄，回傳 None
+    """
+    roster = {}
+    with open(source, 'r', encoding='utf-8-sig') as f:
+        for i, emp in enumerate(iter_json_array(f), start=1):
+            if not isinstance(emp, dict):
+                logger.error(f"❌ 第 {i} 筆員工資料不是物件")
+                return None
+            missing_fields = [field for field in ROSTER_REQUIRED_FIELDS if field not in emp]
+            if missing_fields:
+                logger.error(f"❌ 第 {i} 筆員工資料缺少欄位: {missing_fields}")
+                return None
+
+            emp_id = emp['工號']
+            if emp_id in roster:
+                logger.warning(f"⚠️ 第 {i} 筆員工 {emp_id} 重複,沿用第一筆")
+                continue
+            shift = ROSTER_SHIFT_MAP.get(emp['班別'])
+            if shift is None:
+                logger.warning(f"⚠️ 第 {i} 筆員工 {emp_id} 的班別 '{emp['班別']}' 無效,將使用預設值 2000")
+                shift = '2000'
+            roster[emp_id] = (emp['姓名'], shift)
+    return roster
+
+
+def _roster_import_record(year, month, source_signature, digest):
+    # 簽章 JSON 化後才能與記錄檔比對（tuple → list）
+    return json.loads(json.dumps({
+        'source_signature': source_signature,
+        'sha256': digest,
+        'employees_signature': storage.signature(year, month, 'employees')
+    }))
+
+
+def _load_roster_import_record(year, month):
     try:
-        # 讀取 JSON 檔案
-        with open('emoinfo.json', 'r', encoding='utf-8-sig') as f:
-            employees = json.load(f)
-        
-        # ✅ 新增: 驗證資料格式
-        if not isinstance(employees, list):
-            logger.error("❌ emoinfo.json 必須是陣列格式")
-            return False
-        
-        if len(employees) == 0:
+        with open(get_roster_import_file(year, month), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _save_roster_import_record(year, month, record):
+    path = get_roster_import_file(year, month)
+    get_month_dir(year, month, create=True)
+    tmp_path = path.with_suffix('.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(record, f)
+    os.replace(tmp_path, path)
+
+
+def _diff_roster(current, roster):
+    """比對目前名冊與新名冊，回傳 (新增工號, 移除工號, 班別 / 姓名變更工號)"""
+    added = [emp_id for emp_id in roster if emp_id not in current]
+    removed = [emp_id for emp_id in current if emp_id not in roster]
+    changed = [
+        emp_id for emp_id, (name, shift) in roster.items()
+        if emp_id in current
+        and (current[emp_id].name, current[emp_id].shift_type) != (name, shift)
+    ]
+    return added, removed, changed
+
+
+def import_roster(year=None, month=None, source='emoinfo.json'):
+    """
+    將 emoinfo.json 增量匯入指定月份的名冊
+    - 來源檔內容雜湊與上次相同、名冊也沒被改過時直接跳過
+    - 只寫入差異（新增 / 移除 / 班別變更），保留既有的 has_voted / last_vote_time
+    成功回傳 {'added', 'removed', 'changed', 'skipped'}，來源資料有誤回傳 None
+    """
+    if year is None or month is None:
+        now = datetime.now()
+        year = now.year
+        month = now.month
+
+    source = Path(source)
+    source_signature = file_signature(source)
+    if source_signature is None:
+        raise FileNotFoundError(source)
+
+    with month_write_lock(year, month):
+        record = _load_roster_import_record(year, month)
+        employees_signature = json.loads(json.dumps(storage.signature(year, month, 'employees')))
+        unchanged_roster = record is not None and record.get('employees_signature') == employees_signature
+
+        # 檔案簽章相同就不必計算雜湊；簽章不同但內容相同（例如重新複製）只更新記錄
+        if unchanged_roster and record.get('source_signature') == list(source_signature):
+            return {'added': 0, 'removed': 0, 'changed': 0, 'skipped': True}
+        digest = _hash_file(source)
+        if unchanged_roster and record.get('sha256') == digest:
+            _save_roster_import_record(year, month, _roster_import_record(year, month, source_signature, digest))
+            return {'added': 0, 'removed': 0, 'changed': 0, 'skipped': True}
+
+        roster = _read_roster(source)
+        if roster is None:
+            return None
+        if not roster:
             logger.error("❌ emoinfo.json 為空陣列")
-            return False
-        
-        # ✅ 新增: 驗證每筆資料的必要欄位
-        required_fields = ['工號', '姓名', '班別']
-        for i, emp in enumerate(employees):
-            missing_fields = [f for f in required_fields if f not in emp]
-            if missing_fields:
-                logger.error(f"❌ 第 {i+1} 筆員工資料缺少欄位: {missing_fields}")
-                return False
-            
-            # ✅ 新增: 驗證班別是否有效
-            if emp['班別'] not in ['2000', '3000', 'RR', '輪班']:
-                logger.warning(f"⚠️ 第 {i+1} 筆員工 {emp['工號']} 的班別 '{emp['班別']}' 無效,將使用預設值 2000")
-        
-        employees_file = get_employees_file(year, month)
-        
-        # 檢查是否已有資料
-        existing = read_csv(employees_file)
-
-        # 班別轉換表(統一成 2000 / 3000)
-        shift_map = {
-            'RR': '2000',
-            '輪班': '3000',
-            '2000': '2000',
-            '3000': '3000'
-        }
-        
-        if len(existing) == 0:
-            # 插入員工資料
-            employee_data = []
-            for emp in employees:
-                shift_raw = emp.get('班別', '2000')
-                shift_final = shift_map.get(shift_raw, '2000')  # 預設 2000 防呆
-
-                employee_data.append({
-                    'emp_id': emp['工號'],
-                    'name': emp['姓名'],
-                    'shift_type': shift_final,  # 🔥 統一寫入 2000 / 3000
-                    'has_voted': '0',
-                    'last_vote_time': ''
-                })
-            
-            write_csv(
-                employees_file,
-                employee_data,
-                ['emp_id', 'name', 'shift_type', 'has_voted', 'last_vote_time']
-            )
-            logger.info(f'✅ 成功載入 {len(employees)} 位員工資料到 {year}/{month}')
-        else:
-            logger.info(f'ℹ️ {year}/{month} 已有員工資料,跳過載入')
-        
-        return True
-        
+            return None
+
+        state = get_month_state(year, month)
+        with state.lock:
+            current = {emp.emp_id: emp for emp in state.base['employees']}
+        added, removed, changed = _diff_roster(current, roster)
+
+        new_rows = [
+            {
+                'emp_id': emp_id,
+                'name': roster[emp_id][0],
+                'shift_type': roster[emp_id][1],   # 🔥 統一寫入 2000 / 3000
+                'has_voted': '0',
+                'last_vote_time': ''
+            }
+            for emp_id in added
+        ]
+        if removed or changed:
+            removed_ids = set(removed)
+            rows = []
+            for emp_id, emp in current.items():
+                if emp_id in removed_ids:
+                    continue
+                name, shift = roster[emp_id]
+                row = emp.as_row()
+                if (emp.name, emp.shift_type) != (name, shift):
+                    row.update(name=name, shift_type=shift)
+                rows.append(row)
+            write_table(year, month, 'employees', rows + new_rows)
+        elif new_rows:
+            append_table(year, month, 'employees', new_rows)
+
+        _save_roster_import_record(year, month, _roster_import_record(year, month, source_signature, digest))
+
+    logger.info(
+        f'✅ {year}/{month} 名冊匯入完成: 新增 {len(added)}、移除 {len(removed)}、'
+        f'變更 {len(changed)},共 {len(roster)} 位員工'
+    )
+    return {'added': len(added), 'removed': len(removed), 'changed': len(changed), 'skipped': False}
+
+
+def load_employees_from_json(year=None, month=None):
+    """從 emoinfo.json 載入員工資料到指定月份的 employees.csv（增量套用名冊變動）"""
+    try:
+        return import_roster(year, month) is not None
     except FileNotFoundError:
         logger.error('❌ 找不到 emoinfo.json 檔案')
         return False
@@ -308,24 +2380,23 @@ def load_employees_from_json(year=None, month=None):
 
 
 # 檢查是否可以投票
-def can_vote(emp_id, shift_type, year=None, month=None):
-    """檢查員工本月是否還可以投票"""
+def can_vote(emp_id, shift_type, year=None, month=None, votes_map=None):
+    """
+    檢查員工本月是否還可以投票
+    votes_map: 已取得的 get_monthly_votes_map 結果，批次檢查時可重複使用
+    """
     if year is None or month is None:
         now = datetime.now()
         year = now.year
         month = now.month
     
     quota = get_quota()
-    votes_used = get_or_create_monthly_votes(emp_id, shift_type, year, month)
+    if votes_map is None:
+        votes_map = get_monthly_votes_map(year, month)
+    votes_used = votes_map.get(emp_id, 0)
     
     # ✅ 原始 shift_type ('RR'/'輪班') → 顯示名稱 ('2000'/'3000') → 取對應配額
-    shift_display_map = {
-        'RR': '2000',
-        '輪班': '3000',
-        '2000': '2000',
-        '3000': '3000'
-    }
-    display_shift = shift_display_map.get(shift_type, '2000')
+    display_shift = SHIFT_QUOTA_KEYS.get(shift_type, '2000')
     max_votes = quota[display_shift]
     
     if votes_used < max_votes:
@@ -343,42 +2414,151 @@ def read_votes_by_months(months_list):
     all_votes = []
     
     for year, month in months_list:
-        file = get_month_file(year, month)
-        votes = read_csv(file)
-        all_votes.extend(votes)
+        all_votes.extend(get_month_state(year, month).votes)
     
     return all_votes
 
 # 讀取本月投票記錄
 def read_current_month_votes():
     """讀取當前月份的投票記錄"""
-    now = datetime.now()
-    return read_csv(get_month_file(now.year, now.month))
+    return list(get_month_state().votes)
 
 # 獲取可用的歷史月份列表
 def get_available_months():
     """獲取所有有資料的年月列表"""
-    months = []
-    
-    if not DATA_ROOT.exists():
-        return months
-    
-    for year_dir in sorted(DATA_ROOT.iterdir()):
-        if year_dir.is_dir() and year_dir.name.isdigit():
-            year = int(year_dir.name)
-            for month_dir in sorted(year_dir.iterdir()):
-                if month_dir.is_dir() and month_dir.name.isdigit():
-                    month = int(month_dir.name)
-                    # 檢查是否有投票資料檔案
-                    vote_file = month_dir / f"{year}{month:02d}.csv"
-                    if vote_file.exists():
-                        months.append({
-                            'year': year,
-                            'month': month,
-                            'label': f"{year}年{month}月"
-                        })
-    
-    return months
+    return [
+        {
+            'year': year,
+            'month': month,
+            'label': f"{year}年{month}月"
+        }
+        for year, month in storage.months()
+    ]
+
+# 跨月分析
+def _dense(lookup, column):
+    """以對照表把月份內的索引轉為跨月的整數 id"""
+    if np is not None:
+        return np.asarray(lookup, dtype=np.int64)[np.asarray(column, dtype=np.int64)]
+    return [lookup[value] for value in column]
+
+
+def _concat(columns):
+    if np is not None:
+        return np.concatenate(columns) if columns else np.zeros(0, dtype=np.int64)
+    return list(itertools.chain.from_iterable(columns))
+
+
+def _pair(major, minor, width):
+    """兩個 id 欄位合成一個（major * width + minor），供二維計數"""
+    if np is not None:
+        return major * width + minor
+    return [a * width + b for a, b in zip(major, minor)]
+
+
+def _bincount(values, length):
+    """各 id 的出現次數，回傳長度為 length 的 list"""
+    if np is not None:
+        return np.bincount(values, minlength=length).tolist()
+    counts = [0] * length
+    for value in values:
+        counts[value] += 1
+    return counts
+
+
+def _distinct(values):
+    """出現過的 id（遞增）"""
+    if np is not None:
+        return np.flatnonzero(np.bincount(values)) if len(values) else values
+    return sorted(set(values))
+
+
+def analyze_votes(months_list):
+    """
+    彙總多個月份的投票記錄
+    員工工號在整個區間內對應到連續的整數 id，班別統一為 RR / 輪班；
+    有 NumPy 時以 bincount 計算各 id 的票數，不逐筆建立字典
+    """
+    registry = {}       # 工號 → id
+    employees = []      # id → [工號, 姓名]（姓名取區間內最後出現的）
+    shift_ids = {}      # 顯示班別 → id
+    voters, candidates, voter_shifts, candidate_shifts = [], [], [], []
+    monthly = []
+
+    for year, month in months_list:
+        columns = get_month_state(year, month).vote_columns()
+        people = []
+        for emp_id, name in columns.people:
+            dense = registry.get(emp_id)
+            if dense is None:
+                dense = registry[emp_id] = len(employees)
+                employees.append([emp_id, name])
+            elif name:
+                employees[dense][1] = name
+            people.append(dense)
+        shifts = [shift_ids.setdefault(normalize_shift(shift), len(shift_ids)) for shift in columns.shifts]
+
+        month_voters = _dense(people, columns.voters)
+        voters.append(month_voters)
+        candidates.append(_dense(people, columns.candidates))
+        voter_shifts.append(_dense(shifts, columns.voter_shifts))
+        candidate_shifts.append(_dense(shifts, columns.candidate_shifts))
+        monthly.append({
+            'year': year,
+            'month': month,
+            'ballots': len(month_voters),
+            'voters': len(_distinct(month_voters))
+        })
+
+    voters, candidates = _concat(voters), _concat(candidates)
+    voter_shifts, candidate_shifts = _concat(voter_shifts), _concat(candidate_shifts)
+    size, width = len(employees), max(1, len(shift_ids))
+    shift_names = list(shift_ids)
+
+    received = _bincount(candidates, size)
+    received_by_shift = _bincount(_pair(candidates, voter_shifts, width), size * width)
+    cross = _bincount(_pair(voter_shifts, candidate_shifts, width), width * width)
+    # 投票者以 (id, 班別) 去重後依班別計數
+    distinct_voters = _distinct(_pair(voters, voter_shifts, width))
+    if np is not None:
+        voters_by_shift = _bincount(distinct_voters % width, width)
+    else:
+        voters_by_shift = _bincount([pair % width for pair in distinct_voters], width)
+
+    ranking = sorted((dense for dense in range(size) if received[dense]), key=lambda dense: -received[dense])
+    return {
+        'total_ballots': len(voters),
+        'total_voters': len(_distinct(voters)),
+        'monthly': monthly,
+        'ranking': [
+            {
+                'emp_id': employees[dense][0],
+                'name': employees[dense][1],
+                'vote_count': received[dense],
+                'by_shift': {
+                    shift: received_by_shift[dense * width + i]
+                    for i, shift in enumerate(shift_names)
+                }
+            }
+            for dense in ranking
+        ],
+        'shift_breakdown': {
+            shift: {
+                'ballots': sum(cross[i * width:(i + 1) * width]),
+                'voters': voters_by_shift[i],
+                'votes_received': sum(cross[j * width + i] for j in range(width))
+            }
+            for i, shift in enumerate(shift_names)
+        },
+        'cross_shift': {
+            voter_shift: {
+                candidate_shift: cross[i * width + j]
+                for j, candidate_shift in enumerate(shift_names)
+            }
+            for i, voter_shift in enumerate(shift_names)
+        }
+    }
+
 
 # 班別統一映射
 def normalize_shift(shift_type):
@@ -397,6 +2577,332 @@ def normalize_shift(shift_type):
     }
     return mapping.get(shift_type, shift_type)
 
+# 排行榜即時推播（Server-Sent Events）
+SSE_COALESCE_INTERVAL = 1.0   # 同一月份最多每秒推送一次
+SSE_REFRESH_INTERVAL = 5.0    # 定期檢查其他行程寫入的投票
+SSE_HEARTBEAT = 15.0          # 無事件時送出註解保持連線
+SSE_QUEUE_SIZE = 100
+SSE_RETRY_AFTER = 30          # 連線數已達上限時，建議前端多久後再重試（秒）
+# 推播連線會一直佔用一個 HTTP 執行緒，每個 worker 限制同時開啟的數量
+SSE_MAX_STREAMS = config.getint('SERVER', 'max_streams', fallback=2)
+
+
+class VoteStatsPublisher:
+    """
+    /api/stream/vote_stats 的共用推播器
+    投票寫入時只記下變動的候選人；背景執行緒每個間隔合併一次，算出一次差異後
+    推送給所有訂閱該月份的連線（N 個後台只需一次計算）
+    """
+
+    GROUPS = {'2000': 'rr', 'other': 'shift'}   # tallies 分組 → 前端排行榜名稱
+
+    def __init__(self, interval, max_streams):
+        self.interval = interval
+        self.closed = threading.Event()
+        self._slots = threading.BoundedSemaphore(max_streams)
+        self._lock = threading.Lock()
+        self._subscribers = {}   # (year, month) → {queue}
+        self._pending = {}       # (year, month) → {'reset': bool, '2000': {emp_id}, 'other': {emp_id}}
+        self._published = {}     # (year, month) → {'2000': {emp_id: (名次, 票數)}, 'other': {...}}
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    # 寫入路徑呼叫（持有 MonthState.lock，必須很快）
+    def notify(self, key, group_key, emp_id):
+        if key not in self._subscribers:
+            return
+        with self._lock:
+            self._pending_for(key)[group_key].add(emp_id)
+        self._wakeup.set()
+
+    def notify_reset(self, key):
+        if key not in self._subscribers:
+            return
+        with self._lock:
+            self._pending_for(key)['reset'] = True
+        self._wakeup.set()
+
+    def _pending_for(self, key):
+        return self._pending.setdefault(key, {'reset': False, '2000': set(), 'other': set()})
+
+    def subscribe(self, key):
+        """新增訂閱，回傳 (佇列, 完整排行快照)；連線數已達上限或正在關閉時回傳 None"""
+        if self.closed.is_set() or not self._slots.acquire(blocking=False):
+            return None
+        try:
+            state = get_month_state(*key)
+        except Exception:
+            self._slots.release()
+            raise
+        subscriber = queue.Queue(maxsize=SSE_QUEUE_SIZE)
+        subscriber.resync = False
+        with state.lock, self._lock:
+            self._subscribers.setdefault(key, set()).add(subscriber)
+            snapshot = self._snapshot(key, state)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='vote-stats-publisher', daemon=True)
+                self._thread.start()
+        return subscriber, snapshot
+
+    def unsubscribe(self, key, subscriber):
+        """移除訂閱並歸還連線名額；重複呼叫不會多歸還"""
+        with self._lock:
+            subscribers = self._subscribers.get(key, set())
+            if subscriber not in subscribers:
+                return
+            subscribers.discard(subscriber)
+            if not subscribers:
+                self._subscribers.pop(key, None)
+                self._pending.pop(key, None)
+                self._published.pop(key, None)
+        self._slots.release()
+
+    def close(self):
+        """
+        worker 結束前呼叫：通知所有推播連線結束
+        推播產生器不會自己結束，不通知的話執行緒池 shutdown(wait=True) 會一直等下去
+        """
+        self.closed.set()
+        with self._lock:
+            subscribers = [subscriber for group in self._subscribers.values() for subscriber in group]
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(None)
+            except queue.Full:
+                # 佇列滿代表產生器正在消化事件，下一輪就會看到 closed
+                pass
+
+    def snapshot(self, key):
+        """重新取得完整排行（佇列滿而遺失事件時使用）"""
+        state = get_month_state(*key)
+        with state.lock, self._lock:
+            return self._snapshot(key, state)
+
+    def _snapshot(self, key, state):
+        # 呼叫端須持有 state.lock 與 self._lock；同時以目前排行作為之後差異的基準
+        self._published[key] = {
+            group_key: {
+                emp_id: (pos, tally.entries[emp_id]['vote_count'])
+                for pos, emp_id in enumerate(tally.ranking)
+            }
+            for group_key, tally in ((g, state.tallies[g]) for g in self.GROUPS)
+        }
+        return {
+            'year': key[0],
+            'month': key[1],
+            'rr_ranking': state.tallies['2000'].as_list(),
+            'shift_ranking': state.tallies['other'].as_list()
+        }
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(timeout=SSE_REFRESH_INTERVAL)
+            self._wakeup.clear()
+            try:
+                # 其他行程寫入的投票會在重新載入時觸發 notify_reset
+                for key in list(self._subscribers):
+                    get_month_state(*key)
+                self._publish()
+            except Exception as e:
+                logger.error(f"排行榜推播失敗: {str(e)}")
+            # 合併間隔內的所有投票
+            time.sleep(self.interval)
+
+    def _publish(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+
+        for key, changes in pending.items():
+            state = _month_states.get(key)
+            if state is None:
+                continue
+            with state.lock, self._lock:
+                if key not in self._subscribers:
+                    continue
+                if changes['reset']:
+                    event = ('snapshot', self._snapshot(key, state))
+                else:
+                    deltas = self._deltas(key, state, changes)
+                    if deltas is None:
+                        event = ('snapshot', self._snapshot(key, state))
+                    elif not deltas:
+                        continue
+                    else:
+                        event = ('delta', {'year': key[0], 'month': key[1], 'changes': deltas})
+                subscribers = list(self._subscribers[key])
+
+            for subscriber in subscribers:
+                try:
+                    subscriber.put_nowait(event)
+                except queue.Full:
+                    subscriber.resync = True
+
+    def _deltas(self, key, state, changes):
+        """
+        只比對名次可能變動的區間：變動者的新名次到舊名次之間
+        變動者已不在排行中（記下變動後排行被重新載入或重置）時回傳 None，改送完整快照
+        """
+        if any(state.tallies[group_key].position(emp_id) is None
+               for group_key in self.GROUPS for emp_id in changes[group_key]):
+            return None
+        deltas = []
+        for group_key, name in self.GROUPS.items():
+            changed = changes[group_key]
+            if not changed:
+                continue
+            tally = state.tallies[group_key]
+            published = self._published[key][group_key]
+
+            low = min(tally.position(emp_id) for emp_id in changed)
+            high = max(
+                published[emp_id][0] if emp_id in published else len(tally.ranking) - 1
+                for emp_id in changed
+            )
+            for pos in range(low, min(high, len(tally.ranking) - 1) + 1):
+                emp_id = tally.ranking[pos]
+                entry = tally.entries[emp_id]
+                previous = published.get(emp_id)
+                if previous == (pos, entry['vote_count']):
+                    continue
+                published[emp_id] = (pos, entry['vote_count'])
+                deltas.append({
+                    'group': name,
+                    'emp_id': emp_id,
+                    'name': entry['name'],
+                    'shift_type': entry['shift_type'],
+                    'vote_count': entry['vote_count'],
+                    'rank': pos + 1,
+                    'previous_rank': previous[0] + 1 if previous else None
+                })
+        return deltas
+
+
+vote_stats_publisher = VoteStatsPublisher(SSE_COALESCE_INTERVAL, SSE_MAX_STREAMS)
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+# 條件式 GET（ETag / If-None-Match）
+# ETag 只由各 worker 共用的資訊組成（儲存簽章、SharedVersions 計數、配置內容），
+# 不使用行程內的版本號，否則不同 worker 可能對不同內容回傳相同的 ETag
+
+
+def _request_year_month():
+    """取得查詢參數中的年月，未指定時為當前月份"""
+    year = request.args.get('year', type=int)
+    month = request.args.get('month', type=int)
+    if year is None or month is None:
+        now = datetime.now()
+        year = now.year
+        month = now.month
+    return year, month
+
+
+def month_etag(year, month, with_config=False):
+    """
+    以月份資料的儲存簽章與跨行程計數（與配置內容）組成的強 ETag
+    簽章與計數在狀態鎖內一起讀取，refresh 載入途中會等載入完成，不會與尚未載入的內容配對
+    """
+    state = get_month_state(year, month)
+    with state.lock:
+        parts = [state.shared_version] + [state.signatures.get(kind) for kind in TABLE_FIELDS]
+    digest = hashlib.sha1(json.dumps(parts, default=str).encode('utf-8')).hexdigest()[:16]
+    etag = f"{year}{month:02d}-{digest}"
+    if with_config:
+        etag += f"-c{config_version()}"
+    return etag
+
+
+def conditional_get(etag_func):
+    """
+    為 GET 端點加上 ETag
+    etag_func 在檢視函式之前計算；If-None-Match 相符時直接回 304，不重新計算或序列化回應
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            etag = etag_func(*args, **kwargs)
+            if request.if_none_match.contains(etag):
+                metrics.inc('vote_cache_requests_total', cache='etag', result='hit')
+                response = Response(status=304)
+            else:
+                metrics.inc('vote_cache_requests_total', cache='etag', result='miss')
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+    return decorator
+
+
+def _participation_etag():
+    months_count = request.args.get('months', '6')
+    now = datetime.now()
+    # 當月用記憶體版本；歷史月份用彙總所依據的儲存簽章，不必載入整月資料
+    parts = [months_count, month_etag(now.year, now.month)]
+    year, month = now.year, now.month
+    for _ in range(max(0, int(months_count) - 1)):
+        month -= 1
+        if month < 1:
+            month += 12
+            year -= 1
+        parts.append(_rollup_signature(year, month))
+    digest = hashlib.sha1(json.dumps(parts).encode('utf-8')).hexdigest()[:16]
+    return f"participation-{digest}"
+
+
+# 請求指標
+def _metrics_route():
+    # 以路由規則（而非實際路徑）為標籤，避免工號等參數造成標籤爆量
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+
+@app.before_request
+def _start_request_metrics():
+    g.metrics_start = time.perf_counter()
+    metrics.inc('vote_http_requests_in_flight', 1)
+
+
+@app.after_request
+def _count_request_metrics(response):
+    metrics.inc('vote_http_requests_total', route=_metrics_route(), method=request.method,
+                status=response.status_code)
+    if response.is_streamed and not response.direct_passthrough:
+        # 串流回應（產生器、SSE）在檢視函式返回時還沒送出；teardown 那時就會執行
+        # （stream_with_context 也一樣），改在回應關閉（送完或連線中斷）時結算耗時與 in_flight
+        # send_from_directory 的檔案回應直接交給伺服器，不會呼叫 close 回呼，仍由 teardown 結算
+        start = g.pop('metrics_start', None)
+        if start is not None:
+            route, method = _metrics_route(), request.method
+            response.call_on_close(lambda: _finish_request(start, route, method))
+    return response
+
+
+def _finish_request(start, route, method):
+    metrics.inc('vote_http_requests_in_flight', -1)
+    metrics.observe('vote_http_request_duration_seconds', time.perf_counter() - start,
+                    route=route, method=method)
+
+
+@app.teardown_request
+def _finish_request_metrics(exc):
+    # 串流回應已在 _count_request_metrics 取走開始時間，這裡只結算一般回應與例外
+    start = g.pop('metrics_start', None)
+    if start is None:
+        return
+    _finish_request(start, _metrics_route(), request.method)
+
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus 格式的效能指標"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
 @app.route('/api/rebuild_monthly_votes', methods=['POST'])
 def api_rebuild_monthly_votes():
     """管理員手動重建月度統計 API"""
@@ -425,6 +2931,7 @@ def api_rebuild_monthly_votes():
 
 # API 端點
 @app.route('/api/employees', methods=['GET'])
+@conditional_get(lambda: month_etag(*_request_year_month(), with_config=True))
 def get_employees():
     year = request.args.get('year', type=int)
     month = request.args.get('month', type=int)
@@ -434,43 +2941,32 @@ def get_employees():
         year = now.year
         month = now.month
 
-    employees_file = get_employees_file(year, month)
-
     # 若無檔案，自動載入
-    if not employees_file.exists():
+    if not storage.exists(year, month, 'employees'):
         load_employees_from_json(year, month)
 
-    employees = read_csv(employees_file)
+    state = get_month_state(year, month)
+    employees = state.employees.values()
+    votes_map = state.votes_used   # ★ 一次取得全部已用票數，避免逐人掃描
     quota = get_quota()
 
-    # ★ 班別防呆表
-    shift_fix = {
-        "RR": "2000",
-        "輪班": "3000",
-        "2000": "2000",
-        "3000": "3000",
-        "": "2000"   # 空值也給預設
-    }
-
     result = []
     for emp in employees:
-        emp_id = emp['emp_id']
+        emp_id = emp.emp_id
 
-        # ★ 修正後 shift_raw 永遠是 2000 / 3000
-        shift_raw = shift_fix.get(emp['shift_type'], "2000")
+        # ★ 班別代碼對應的配額鍵永遠是 2000 / 3000（空值或未知值給預設 2000）
+        shift_raw = emp.quota_key
 
-        votes_used = get_or_create_monthly_votes(
-            emp_id, shift_raw, year, month
-        )
+        votes_used = votes_map.get(emp_id, 0)
 
         max_votes = quota[shift_raw]
 
         result.append({
             'emp_id': emp_id,
-            'name': emp['name'],
+            'name': emp.name,
             'shift_type': shift_raw,      # 直接回傳 2000 / 3000
-            'has_voted': emp['has_voted'] == '1',
-            'last_vote_time': emp['last_vote_time'] or None,
+            'has_voted': emp.has_voted,
+            'last_vote_time': emp.last_vote_time or None,
             'votes_used': votes_used,
             'max_votes': max_votes
         })
@@ -479,7 +2975,98 @@ def get_employees():
 
 
 
+# 准入控制
+class AdmissionControl:
+    """
+    寫入路徑前的有界准入佇列（每個 worker 行程各自計算）
+    同時最多 concurrency 個請求進入，另可有 queue_depth 個依到達順序排隊；佇列已滿或等待超過 timeout 秒時
+    立即回 429 + Retry-After，請求不在伺服器端堆積到客戶端逾時重送
+    名額釋放時直接交給隊首，有人排隊時不會有空名額，新請求也無法插隊
+    排隊中的請求會佔用 HTTP 執行緒，concurrency + queue_depth（加上 [SERVER] max_streams）應小於 threads
+    concurrency 同時也是每個 worker 一批群組提交（BallotWriter）最多能收集的選票數，設太小會失去批次效果
+    """
+
+    def __init__(self, name, concurrency, queue_depth, timeout, retry_after):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue_depth = queue_depth
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._lock = threading.Lock()
+        self._waiters = deque()    # 排隊中的請求，各自一個 Event；依到達順序交付名額
+        self.active = 0
+
+    @property
+    def waiting(self):
+        return len(self._waiters)
+
+    def acquire(self):
+        """取得名額回傳 True；佇列已滿或等待逾時回傳 False"""
+        start = time.monotonic()
+        with self._lock:
+            if self.active < self.concurrency and not self._waiters:
+                self.active += 1
+                waiter = None
+            elif len(self._waiters) >= self.queue_depth:
+                metrics.inc('vote_admission_rejected_total', route=self.name, reason='queue_full')
+                return False
+            else:
+                waiter = threading.Event()
+                self._waiters.append(waiter)
+                metrics.inc('vote_admission_queue_depth', route=self.name)
+
+        if waiter is not None and not waiter.wait(self.timeout):
+            with self._lock:
+                # 逾時與交付同時發生時以交付為準（release 已把名額算給這個請求）
+                if not waiter.is_set():
+                    self._waiters.remove(waiter)
+                    metrics.inc('vote_admission_queue_depth', -1, route=self.name)
+                    metrics.inc('vote_admission_rejected_total', route=self.name, reason='timeout')
+                    return False
+        metrics.inc('vote_admission_active', route=self.name)
+        metrics.observe('vote_admission_wait_seconds', time.monotonic() - start, route=self.name)
+        return True
+
+    def release(self):
+        with self._lock:
+            if self._waiters:
+                # 名額直接交給隊首，active 不變
+                self._waiters.popleft().set()
+                metrics.inc('vote_admission_queue_depth', -1, route=self.name)
+            else:
+                self.active -= 1
+        metrics.inc('vote_admission_active', -1, route=self.name)
+
+
+def admission_controlled(control):
+    """以 AdmissionControl 保護檢視函式，未取得名額時回 429"""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if not control.acquire():
+                response = jsonify({'error': '目前投票人數眾多，請稍後再試'})
+                response.status_code = 429
+                response.headers['Retry-After'] = str(control.retry_after)
+                return response
+            try:
+                return view(*args, **kwargs)
+            finally:
+                control.release()
+        return wrapper
+    return decorator
+
+
+vote_admission = AdmissionControl(
+    'vote',
+    concurrency=config.getint('ADMISSION', 'vote_concurrency', fallback=16),
+    queue_depth=config.getint('ADMISSION', 'vote_queue_depth', fallback=8),
+    timeout=config.getfloat('ADMISSION', 'vote_queue_timeout', fallback=2.0),
+    retry_after=config.getint('ADMISSION', 'retry_after', fallback=1)
+)
+
+
 @app.route('/api/vote', methods=['POST'])
+@admission_controlled(vote_admission)
 def submit_vote():
     data = request.json
     voter_emp_id = data.get('voter_emp_id')
@@ -493,79 +3080,185 @@ def submit_vote():
         year = now.year
         month = now.month
 
-    employees_file = get_employees_file(year, month)
-    employees = read_csv(employees_file, key_field='emp_id')
+    employees = get_month_state(year, month).employees
 
     if voter_emp_id not in employees:
         return jsonify({'error': '投票者工號不存在'}), 404
 
     voter = employees[voter_emp_id]
-    voter_shift = voter['shift_type']  # 保留數字 2000 / 3000
 
-    # 檢查配額
-    can_vote_now, message, votes_used, max_votes = can_vote(voter_emp_id, voter_shift, year, month)
-    if not can_vote_now:
+    voted_for_list = []
+    for vid in voted_for_emp_ids:
+        if vid not in employees:
+            return jsonify({'error': f'候選人工號不存在: {vid}'}), 404
+        
+        voted_for_list.append(employees[vid])
+
+    # ★ 同一投票者序列化處理，避免兩個請求同時通過配額檢查
+    with voter_lock(year, month, voter_emp_id):
+        ok, message, new_used, max_votes = commit_ballot(year, month, voter, voted_for_list)
+
+    if not ok:
         return jsonify({'error': message}), 403
 
-    remaining = max_votes - votes_used
-    if len(voted_for_emp_ids) > remaining:
-        return jsonify({'error': f'投票數量超過配額，剩餘 {remaining}'}), 403
+    return jsonify({
+        'success': True,
+        'message': f'投票成功 ({new_used}/{max_votes})',
+        'votes_used': new_used,
+        'max_votes': max_votes
+    })
+
+
+def commit_ballot(year, month, voter, voted_for_list):
+    """
+    交給群組提交寫入一張選票，寫入落地後才返回
+    回傳 (是否成功, 錯誤訊息, 更新後已用票數, 配額上限)
+    """
+    return ballot_writer.submit(year, month, voter, voted_for_list).result()
+
+
+def commit_ballots(year, month, ballots, timestamps=None):
+    """
+    在月份寫入鎖內依序重新檢查配額，通過的選票一起寫入（投票記錄與增量記錄各追加一次）
+    ballots: [(投票者, 候選人列表)]
+    timestamps: 與 ballots 對應的投票時間（例如紙本選票），未指定的使用目前時間
+    回傳與 ballots 對應的 [(是否成功, 錯誤訊息, 更新後已用票數, 配額上限)]
+    """
+    with month_write_lock(year, month):
+        # 取得鎖後重新載入，確保看到其他行程剛寫入的票數
+        state = get_month_state(year, month)
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+        # 同一批中同一位投票者的前一張選票也要計入配額
+        batch_used = {}
+        votes_map = ChainMap(batch_used, state.votes_used)
+        results = []
+        accepted = []   # (results 索引, 投票者工號, 配額上限)
+        vote_rows = []
+        counters = []
+
+        for i, (voter, voted_for_list) in enumerate(ballots):
+            voter_emp_id = voter.emp_id
+            voter_shift = voter.shift_type
+            timestamp = (timestamps[i] if timestamps else None) or now
+
+            can_vote_now, message, votes_used, max_votes = can_vote(
+                voter_emp_id, voter_shift, year, month, votes_map=votes_map
+            )
+            if not can_vote_now:
+                results.append((False, message, votes_used, max_votes))
+                continue
+
+            remaining = max_votes - votes_used
+            if len(voted_for_list) > remaining:
+                results.append((False, f'投票數量超過配額，剩餘 {remaining}', votes_used, max_votes))
+                continue
+
+            batch_used[voter_emp_id] = votes_used + len(voted_for_list)
+            vote_rows.extend(
+                {
+                    'timestamp': timestamp,
+                    'year_month': f"{year}{month:02d}",
+                    'voter_emp_id': voter_emp_id,
+                    'voter_name': voter.name,
+                    'voter_shift': voter_shift,  # ★ 保留 2000 / 3000
+                    'voted_for_emp_id': target.emp_id,
+                    'voted_for_name': target.name,
+                    'voted_for_shift': target.shift_type  # ★ 保留 2000 / 3000
+                }
+                for target in voted_for_list
+            )
+            counters.append((voter_emp_id, voter_shift, len(voted_for_list), timestamp))
+            accepted.append((len(results), voter_emp_id, max_votes))
+            results.append(None)
+
+        if not counters:
+            return results
+
+        # 整批選票的所有記錄一次寫入
+        if vote_rows:
+            append_table(year, month, 'votes', vote_rows)
+
+        # 票數與投票旗標只追加增量記錄，不重寫整份檔案
+        used = record_ballots(counters, year, month)
+
+    for index, voter_emp_id, max_votes in accepted:
+        results[index] = (True, None, used[voter_emp_id], max_votes)
+    return results
+
+
+# 選票群組提交
+GROUP_COMMIT_WINDOW = 0.002   # 第一張選票到達後，再等待多久收集同一批（秒）
+GROUP_COMMIT_MAX = 256        # 每批最多選票數
+
+
+class BallotWriter:
+    """
+    選票的群組提交
+    /api/vote 把選票排入佇列後等待；背景執行緒把短時間內到達的選票依月份分批，
+    每批只追加一次投票記錄與一次增量記錄（各 fsync 一次），落地後才讓請求返回
+    """
 
-    voted_for_list = []
-    for vid in voted_for_emp_ids:
-        if vid not in employees:
-            return jsonify({'error': f'候選人工號不存在: {vid}'}), 404
-        
-        target = employees[vid]
-        target_shift = target['shift_type']  # 保留數字
-        voted_for_list.append(target)
+    def __init__(self, window=GROUP_COMMIT_WINDOW, max_batch=GROUP_COMMIT_MAX):
+        self.window = window
+        self.max_batch = max_batch
+        self._guard = threading.Lock()
+        self._queue = None
+        self._pid = None
 
-    vote_file = get_month_file(year, month)
-    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    def submit(self, year, month, voter, voted_for_list):
+        """排入一張選票，回傳 Future，結果同 commit_ballots 的單筆"""
+        future = Future()
+        self._ensure_thread().put((int(year), int(month), voter, voted_for_list, future))
+        return future
 
-    # 寫入記錄
-    for target in voted_for_list:
-        append_csv(
-            vote_file,
-            {
-                'timestamp': timestamp,
-                'year_month': f"{year}{month:02d}",
-                'voter_emp_id': voter_emp_id,
-                'voter_name': voter['name'],
-                'voter_shift': voter_shift,  # ★ 保留 2000 / 3000
-                'voted_for_emp_id': target['emp_id'],
-                'voted_for_name': target['name'],
-                'voted_for_shift': target['shift_type']  # ★ 保留 2000 / 3000
-            },
-            [
-                'timestamp', 'year_month',
-                'voter_emp_id', 'voter_name', 'voter_shift',
-                'voted_for_emp_id', 'voted_for_name', 'voted_for_shift'
-            ]
-        )
+    def _ensure_thread(self):
+        # fork 出的 worker 不會繼承父行程的執行緒，需各自啟動
+        with self._guard:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._pid = os.getpid()
+                threading.Thread(
+                    target=self._run, args=(self._queue,), name='ballot-writer', daemon=True
+                ).start()
+            return self._queue
 
-        update_monthly_votes(voter_emp_id, voter_shift, year, month)
+    def _run(self, pending):
+        while True:
+            batch = [pending.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                try:
+                    batch.append(pending.get(timeout=timeout) if timeout > 0 else pending.get_nowait())
+                except queue.Empty:
+                    break
+            self._commit(batch)
 
-    voter['has_voted'] = '1'
-    voter['last_vote_time'] = timestamp
+    def _commit(self, batch):
+        by_month = {}
+        for item in batch:
+            by_month.setdefault(item[:2], []).append(item)
 
-    write_csv(
-        employees_file,
-        list(employees.values()),
-        ['emp_id', 'name', 'shift_type', 'has_voted', 'last_vote_time']
-    )
+        for (year, month), items in by_month.items():
+            try:
+                results = commit_ballots(year, month, [(voter, targets) for _, _, voter, targets, _ in items])
+            except Exception as e:
+                logger.error(f"❌ {year}/{month} 批次寫入選票失敗: {str(e)}")
+                for item in items:
+                    item[4].set_exception(e)
+                continue
+            metrics.inc('vote_ballot_batches_total')
+            metrics.inc('vote_ballots_committed_total', len(items))
+            for item, result in zip(items, results):
+                item[4].set_result(result)
 
-    new_used = votes_used + len(voted_for_emp_ids)
 
-    return jsonify({
-        'success': True,
-        'message': f'投票成功 ({new_used}/{max_votes})',
-        'votes_used': new_used,
-        'max_votes': max_votes
-    })
+ballot_writer = BallotWriter()
 
 
 @app.route('/api/vote_stats', methods=['GET'])
+@conditional_get(lambda: month_etag(*_request_year_month()))
 def get_vote_stats():
     year = request.args.get('year', type=int)
     month = request.args.get('month', type=int)
@@ -575,30 +3268,11 @@ def get_vote_stats():
         year = now.year
         month = now.month
 
-    vote_file = get_month_file(year, month)
-    all_votes = read_csv(vote_file)
-
-    rr_votes = {}
-    shift_votes = {}
-
-    for vote in all_votes:
-        shift = vote.get('voted_for_shift')  # 2000 or 3000
-
-        target_dict = rr_votes if shift == '2000' else shift_votes
-
-        vid = vote['voted_for_emp_id']
-        if vid not in target_dict:
-            target_dict[vid] = {
-                'emp_id': vid,
-                'name': vote['voted_for_name'],
-                'vote_count': 0,
-                'shift_type': shift  # ★ 回傳數字
-            }
-
-        target_dict[vid]['vote_count'] += 1
-
-    rr_ranking = sorted(rr_votes.values(), key=lambda x: x['vote_count'], reverse=True)
-    shift_ranking = sorted(shift_votes.values(), key=lambda x: x['vote_count'], reverse=True)
+    # ★ 排行榜隨投票增量維護，這裡只需複製輸出
+    state = get_month_state(year, month)
+    with state.lock:
+        rr_ranking = state.tallies['2000'].as_list()
+        shift_ranking = state.tallies['other'].as_list()
 
     return jsonify({
         'year': year,
@@ -609,7 +3283,56 @@ def get_vote_stats():
 
 
 
+@app.route('/api/stream/vote_stats', methods=['GET'])
+def stream_vote_stats():
+    """
+    以 SSE 推送排行榜：先送完整快照，之後只送名次 / 票數有變動的候選人
+    每個 worker 最多 SSE_MAX_STREAMS 條連線，超過時回 503，前端改以一般查詢並稍後重試
+    """
+    key = _request_year_month()
+    subscribed = vote_stats_publisher.subscribe(key)
+    if subscribed is None:
+        response = jsonify({'error': '即時排行連線數已達上限，請稍後再試'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(SSE_RETRY_AFTER)
+        return response
+    subscriber, snapshot = subscribed
+
+    def generate():
+        try:
+            yield _sse('snapshot', snapshot)
+            while not vote_stats_publisher.closed.is_set():
+                try:
+                    item = subscriber.get(timeout=SSE_HEARTBEAT)
+                except queue.Empty:
+                    yield ': ping\n\n'
+                    continue
+                if item is None:
+                    # worker 正在結束
+                    break
+                event, data = item
+                if subscriber.resync:
+                    # 佇列曾滿而遺失事件，改送一次完整快照
+                    while not subscriber.empty():
+                        subscriber.get_nowait()
+                    subscriber.resync = False
+                    event, data = 'snapshot', vote_stats_publisher.snapshot(key)
+                yield _sse(event, data)
+        finally:
+            vote_stats_publisher.unsubscribe(key, subscriber)
+
+    response = Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    # 產生器還沒開始就被關閉時不會執行 finally，在回應關閉時也歸還名額
+    response.call_on_close(lambda: vote_stats_publisher.unsubscribe(key, subscriber))
+    return response
+
+
 @app.route('/api/monthly_participation', methods=['GET'])
+@conditional_get(_participation_etag)
 def get_monthly_participation():
     months_count = int(request.args.get('months', 6))
     
@@ -627,9 +3350,9 @@ def get_monthly_participation():
         months_to_query.append((year, month))
 
     # fallback 最新月份
-    fallback_employees = read_csv(get_employees_file(now.year, now.month))
-    fallback_total_rr = sum(1 for emp in fallback_employees if normalize_shift(emp.get('shift_type')) == 'RR')
-    fallback_total_shift = sum(1 for emp in fallback_employees if normalize_shift(emp.get('shift_type')) == '輪班')
+    fallback = get_month_rollup(now.year, now.month)['headcount']
+    fallback_total_rr = fallback['RR']
+    fallback_total_shift = fallback['輪班']
 
     labels = []
     rr_rates = []
@@ -643,10 +3366,11 @@ def get_monthly_participation():
         label = f"{year}-{month:02d}"
         labels.append(label)
 
-        employees = read_csv(get_employees_file(year, month))
+        # ★ 只讀月份彙總，不重新掃描員工與投票記錄
+        rollup = get_month_rollup(year, month)
 
-        total_rr = sum(1 for emp in employees if normalize_shift(emp.get('shift_type')) == 'RR')
-        total_shift = sum(1 for emp in employees if normalize_shift(emp.get('shift_type')) == '輪班')
+        total_rr = rollup['headcount']['RR']
+        total_shift = rollup['headcount']['輪班']
         total_employees = total_rr + total_shift
 
         if total_rr == 0:
@@ -656,14 +3380,11 @@ def get_monthly_participation():
         if total_employees == 0:
             total_employees = fallback_total_rr + fallback_total_shift
 
-        monthly_votes = read_csv(get_monthly_votes_file(year, month))
+        rr_count = rollup['voters']['RR']
+        shift_count = rollup['voters']['輪班']
 
-        rr_count = len([r for r in monthly_votes if normalize_shift(r.get('shift_type')) == 'RR' and int(r.get('votes_used', 0)) > 0])
-        shift_count = len([r for r in monthly_votes if normalize_shift(r.get('shift_type')) == '輪班' and int(r.get('votes_used', 0)) > 0])
-
-        all_votes = read_csv(get_month_file(year, month))
-        rr_vote_count = sum(1 for v in all_votes if normalize_shift(v.get('voter_shift')) == 'RR')
-        shift_vote_count = sum(1 for v in all_votes if normalize_shift(v.get('voter_shift')) == '輪班')
+        rr_vote_count = rollup['ballots']['RR']
+        shift_vote_count = rollup['ballots']['輪班']
 
         rr_rates.append(min(100, round((rr_count / total_rr) * 100, 1)))
         shift_rates.append(min(100, round((shift_count / total_shift) * 100, 1)))
@@ -707,31 +3428,165 @@ def reset_votes():
         month = now.month
     
     try:
-        # 刪除投票記錄
-        vote_file = get_month_file(year, month)
-        if vote_file.exists():
-            vote_file.unlink()
-        
-        # 刪除月度統計
-        monthly_votes_file = get_monthly_votes_file(year, month)
-        if monthly_votes_file.exists():
-            monthly_votes_file.unlink()
-        
-        # 重置員工投票狀態
-        employees_file = get_employees_file(year, month)
-        employees = read_csv(employees_file)
-        
-        for emp in employees:
-            emp['has_voted'] = '0'
-            emp['last_vote_time'] = ''
-        
-        write_csv(employees_file, employees,
-                 ['emp_id', 'name', 'shift_type', 'has_voted', 'last_vote_time'])
+        with month_write_lock(year, month):
+            # 刪除投票記錄
+            remove_table(year, month, 'votes')
+            
+            # 刪除月度統計與增量記錄
+            remove_table(year, month, 'vote_log')
+            remove_table(year, month, 'monthly_votes')
+            
+            # 重置員工投票狀態
+            employees = [
+                dict(emp.as_row(), has_voted='0', last_vote_time='')
+                for emp in get_month_state(year, month).employees.values()
+            ]
+            
+            write_table(year, month, 'employees', employees)
         
         return jsonify({'success': True, 'message': f'{year}年{month}月投票已重置'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# 紙本選票批次匯入
+def _read_ballot_import(text, fmt):
+    """
+    逐行讀取匯入檔，產生 (行號, 投票者工號, [候選人工號], 投票時間或 None)
+    欄位名稱與 /api/vote 相同；CSV 的 voted_for_emp_ids 以 ; 分隔
+    無法解析的行產生 (行號, None, 錯誤訊息, None)
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        missing = {'voter_emp_id', 'voted_for_emp_ids'} - set(reader.fieldnames or ())
+        if missing:
+            raise csv.Error(f"缺少欄位: {', '.join(sorted(missing))}")
+        for row in reader:
+            candidates = [vid.strip() for vid in (row.get('voted_for_emp_ids') or '').split(';') if vid.strip()]
+            yield reader.line_num, (row.get('voter_emp_id') or '').strip(), candidates, row.get('timestamp') or None
+        return
+
+    for line_num, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+            candidates = row.get('voted_for_emp_ids') or []
+            if isinstance(candidates, str):
+                candidates = [candidates]
+            # 只接受字串或字串陣列；數字 / 物件等其他型別視為格式錯誤，不當成候選人匯入
+            if not isinstance(candidates, list) or not all(isinstance(vid, str) for vid in candidates):
+                raise TypeError('voted_for_emp_ids 必須是工號字串或字串陣列')
+        except (ValueError, AttributeError, TypeError) as e:
+            yield line_num, None, f'無法解析: {e}', None
+            continue
+        yield line_num, str(row.get('voter_emp_id') or ''), candidates, row.get('timestamp') or None
+
+
+def import_ballots(year, month, entries):
+    """
+    批次匯入紙本選票
+    entries: _read_ballot_import 產生的 (行號, 投票者工號, [候選人工號], 投票時間)
+    一次走訪檢查名冊與投票時間，再交給 commit_ballots 檢查配額並以一次追加寫入所有通過的選票
+    回傳 {'accepted', 'votes', 'rejected', 'rejections': [{'line', 'voter_emp_id', 'error'}]}
+    """
+    now = datetime.now()
+    current_month = (year, month) == (now.year, now.month)
+    employees = get_month_state(year, month).employees
+
+    ballots, timestamps, lines = [], [], []
+    rejections = []
+    for line_num, voter_emp_id, candidates, timestamp in entries:
+        if voter_emp_id is None:
+            error = candidates
+        elif voter_emp_id not in employees:
+            error = f'投票者工號不存在: {voter_emp_id}'
+        elif not candidates:
+            error = '沒有候選人'
+        elif any(vid not in employees for vid in candidates):
+            error = f"候選人工號不存在: {', '.join(vid for vid in candidates if vid not in employees)}"
+        elif timestamp is None:
+            error = None if current_month else '缺少投票時間'
+        else:
+            try:
+                parsed = datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S')
+                error = None if (parsed.year, parsed.month) == (year, month) else f'投票時間不在 {year}/{month}: {timestamp}'
+            except ValueError:
+                error = f'投票時間格式錯誤: {timestamp}（應為 YYYY-MM-DD HH:MM:SS）'
+
+        if error:
+            rejections.append({'line': line_num, 'voter_emp_id': voter_emp_id, 'error': error})
+            continue
+        ballots.append((employees[voter_emp_id], [employees[vid] for vid in candidates]))
+        timestamps.append(timestamp)
+        lines.append(line_num)
+
+    accepted = 0
+    votes = 0
+    results = commit_ballots(year, month, ballots, timestamps) if ballots else []
+    for line_num, (voter, targets), (ok, message, _, _) in zip(lines, ballots, results):
+        if ok:
+            accepted += 1
+            votes += len(targets)
+        else:
+            rejections.append({'line': line_num, 'voter_emp_id': voter.emp_id, 'error': message})
+    rejections.sort(key=lambda rejection: rejection['line'])
+
+    logger.info(f"📥 {year}/{month} 匯入紙本選票: 通過 {accepted} 張（{votes} 票）、拒絕 {len(rejections)} 張")
+    return {'accepted': accepted, 'votes': votes, 'rejected': len(rejections), 'rejections': rejections}
+
+
+@app.route('/api/import_ballots', methods=['POST'])
+def import_ballots_api():
+    """
+    批次匯入紙本選票（僅管理員）
+    以 multipart 上傳 file，或直接以檔案內容為請求本文；format 為 csv / ndjson（預設依副檔名或 Content-Type 判斷）
+    admin_id / year / month / format 放在查詢字串（multipart 時也可放在表單）
+    直接上傳本文時不讀取表單：curl --data-binary 預設的 x-www-form-urlencoded 會被當成表單解析而吃掉檔案內容
+    """
+    multipart = request.mimetype == 'multipart/form-data'
+    params = request.values if multipart else request.args
+    admin_id = params.get('admin_id')
+    year = params.get('year', type=int)
+    month = params.get('month', type=int)
+
+    if admin_id not in ['K18251', 'G9745']:
+        return jsonify({'error': '無權限'}), 403
+
+    if year is None or month is None:
+        now = datetime.now()
+        year = now.year
+        month = now.month
+
+    upload = request.files.get('file') if multipart else None
+    if multipart and upload is None:
+        return jsonify({'error': '缺少上傳檔案 file'}), 400
+    stream = upload.stream if upload else request.stream
+    filename = (upload.filename or '') if upload else ''
+    fmt = params.get('format')
+    if fmt is None:
+        ndjson = filename.endswith(('.ndjson', '.jsonl')) or request.mimetype == 'application/x-ndjson'
+        fmt = 'ndjson' if ndjson else 'csv'
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({'error': f'不支援的格式: {fmt}'}), 400
+
+    if not storage.exists(year, month, 'employees'):
+        logger.warning(f"⚠️ employees.csv 不存在於 {year}/{month},自動載入...")
+        load_employees_from_json(year, month)
+
+    try:
+        text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+        result = import_ballots(year, month, _read_ballot_import(text, fmt))
+    except (UnicodeDecodeError, csv.Error) as e:
+        return jsonify({'error': f'無法讀取匯入檔: {e}'}), 400
+    except Exception as e:
+        logger.error(f'匯入紙本選票失敗: {str(e)}')
+        return jsonify({'error': str(e)}), 500
+
+    if not result['accepted'] and not result['rejected']:
+        return jsonify({'error': '匯入檔沒有任何選票'}), 400
+    return jsonify({'success': True, **result})
+
+
 @app.route('/api/load_employees', methods=['POST'])
 def load_employees():
     """從 JSON 載入員工資料"""
@@ -740,8 +3595,9 @@ def load_employees():
     month = data.get('month')
     
     try:
-        if load_employees_from_json(year, month):
-            return jsonify({'success': True, 'message': f'員工資料已載入到 {year}/{month}'})
+        result = import_roster(year, month)
+        if result is not None:
+            return jsonify({'success': True, 'message': f'員工資料已載入到 {year}/{month}', **result})
         else:
             return jsonify({'error': '載入失敗'}), 500
     except Exception as e:
@@ -749,6 +3605,7 @@ def load_employees():
 
 
 @app.route('/api/check_status/<emp_id>', methods=['GET'])
+@conditional_get(lambda emp_id: month_etag(*_request_year_month(), with_config=True))
 def check_status(emp_id):
     year = request.args.get('year', type=int)
     month = request.args.get('month', type=int)
@@ -758,14 +3615,13 @@ def check_status(emp_id):
         year = now.year
         month = now.month
 
-    employees_file = get_employees_file(year, month)
-    
     # ✅ 新增: 若檔案不存在,自動從 JSON 載入
-    if not employees_file.exists():
+    if not storage.exists(year, month, 'employees'):
         logger.warning(f"⚠️ employees.csv 不存在於 {year}/{month},自動載入...")
         load_employees_from_json(year, month)
     
-    employees = read_csv(employees_file, key_field='emp_id')
+    state = get_month_state(year, month)
+    employees = state.employees
 
     if emp_id not in employees:
         return jsonify({'error': '工號不存在'}), 404
@@ -773,17 +3629,17 @@ def check_status(emp_id):
     emp = employees[emp_id]
 
     # ✅ 關鍵修正:原始值 → 統一轉 2000/3000 再回傳
-    shift_raw = emp['shift_type']
-    shift_display_map = {'RR': '2000', '輪班': '3000', '2000': '2000', '3000': '3000'}
-    display_shift = shift_display_map.get(shift_raw, '2000')
+    display_shift = emp.quota_key
 
-    can_vote_now, msg, votes_used, max_votes = can_vote(emp_id, shift_raw, year, month)
+    can_vote_now, msg, votes_used, max_votes = can_vote(
+        emp_id, emp.shift_type, year, month, votes_map=state.votes_used
+    )
 
     return jsonify({
-        'name': emp['name'],
+        'name': emp.name,
         'shift_type': display_shift,      # ← 改為 2000 / 3000
-        'has_voted': emp['has_voted'] == '1',
-        'last_vote_time': emp['last_vote_time'] or None,
+        'has_voted': emp.has_voted,
+        'last_vote_time': emp.last_vote_time or None,
         'can_vote': can_vote_now,
         'message': msg if not can_vote_now else f"可以投票 (已用 {votes_used}/{max_votes})",
         'votes_used': votes_used,
@@ -822,6 +3678,7 @@ def login():
 
 
 @app.route('/api/candidates/<emp_id>', methods=['GET'])
+@conditional_get(lambda emp_id: month_etag(*_request_year_month(), with_config=True))
 def get_candidates(emp_id):
     year = request.args.get('year', type=int)
     month = request.args.get('month', type=int)
@@ -831,47 +3688,42 @@ def get_candidates(emp_id):
         year = now.year
         month = now.month
     
-    employees_file = get_employees_file(year, month)
-    
     # ✅ 新增: 若檔案不存在,自動從 JSON 載入
-    if not employees_file.exists():
+    if not storage.exists(year, month, 'employees'):
         logger.warning(f"⚠️ employees.csv 不存在於 {year}/{month},自動載入...")
         load_employees_from_json(year, month)
     
-    employees = read_csv(employees_file, key_field='emp_id')
+    state = get_month_state(year, month)
+    employees = state.employees
     
     if emp_id not in employees:
         return jsonify({'error': '工號不存在,請確認您的工號'}), 404
     
     voter = employees[emp_id]
-    voter_shift = normalize_shift(voter['shift_type'])
+    voter_shift = voter.display_shift
 
-    can_vote_now, error_message, votes_used, max_votes = can_vote(emp_id, voter['shift_type'], year, month)
+    can_vote_now, error_message, votes_used, max_votes = can_vote(
+        emp_id, voter.shift_type, year, month, votes_map=state.votes_used
+    )
     
     if not can_vote_now:
         return jsonify({'error': error_message}), 400
     
     target_shift = 'RR' if voter_shift == '輪班' else '輪班'
-    
-    candidates = []
-    for e_id, emp in employees.items():
-        if normalize_shift(emp['shift_type']) == target_shift:
-            candidates.append({
-                'emp_id': emp['emp_id'],
-                'name': emp['name'],
-                'shift_type': normalize_shift(emp['shift_type'])
-            })
-    
-    return jsonify({
-        'candidates': candidates,
-        'voter_info': {
-            'emp_id': emp_id,
-            'name': voter['name'],
-            'shift_type': voter_shift,
-            'votes_used': votes_used,
-            'max_votes': max_votes
-        }
-    })
+
+    # 候選人清單沿用快取的 JSON，每位投票者只需序列化 voter_info
+    voter_info = app.json.dumps({
+        'emp_id': emp_id,
+        'name': voter.name,
+        'shift_type': voter_shift,
+        'votes_used': votes_used,
+        'max_votes': max_votes
+    }).encode('utf-8')
+    body = b''.join((
+        b'{"candidates":', state.candidates_json(target_shift),
+        b',"voter_info":', voter_info, b'}'
+    ))
+    return Response(body, mimetype='application/json')
 
 
 @app.route('/api/check_admin/<emp_id>', methods=['GET'])
@@ -881,6 +3733,7 @@ def check_admin(emp_id):
     return jsonify({'is_admin': is_admin})
 
 @app.route('/api/quotas', methods=['GET'])
+@conditional_get(lambda: f"quotas-c{config_version()}")
 def get_quotas():
     quota = get_quota()  # {'2000': X, '3000': Y}
 
@@ -911,7 +3764,20 @@ def update_quotas():
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/reload_config', methods=['POST'])
+def reload_config():
+    """管理員手動重新載入 config.ini"""
+    snapshot = get_config(force=True)
+    return jsonify({
+        'success': True,
+        'version': snapshot.version,
+        'quota_2000': snapshot.quotas['2000'],
+        'quota_3000': snapshot.quotas['3000']
+    })
+
+
 @app.route('/api/votes', methods=['GET'])
+@conditional_get(lambda: month_etag(*_request_year_month()))
 def get_votes():
     year = request.args.get('year', type=int)
     month = request.args.get('month', type=int)
@@ -921,41 +3787,94 @@ def get_votes():
         year = now.year
         month = now.month
 
-    vote_file = get_month_file(year, month)
-    votes = read_csv(vote_file)
+    # 分頁與篩選參數（皆為選填，未指定時回傳整月記錄）
+    limit = request.args.get('limit', type=int)
+    after = request.args.get('after', type=int)
+    output_format = request.args.get('format', 'json')
+    filters = {
+        field: request.args.get(param)
+        for param, field in VOTE_FILTERS.items()
+        if request.args.get(param)
+    }
+
+    if limit is not None and limit < 1:
+        return jsonify({'error': 'limit 必須大於 0'}), 400
+    if after is not None and after < 0:
+        return jsonify({'error': 'after 不可為負數'}), 400
+    if output_format not in ('json', 'ndjson', 'csv'):
+        return jsonify({'error': f'不支援的格式: {output_format}'}), 400
+
+    state = get_month_state(year, month)
+    matched = state.iter_votes(filters, after)
+    if limit is not None:
+        matched = itertools.islice(matched, limit)
+
+    if output_format == 'ndjson':
+        return Response(
+            stream_with_context(_stream_votes_ndjson(matched)),
+            mimetype='application/x-ndjson'
+        )
+    if output_format == 'csv':
+        return Response(
+            stream_with_context(_stream_votes_csv(matched)),
+            mimetype='text/csv',
+            headers={'Content-Disposition': f'attachment; filename={year}{month:02d}.csv'}
+        )
 
     # ★ 不做任何 shift 轉換，照原樣（2000 / 3000）
-    return jsonify({
+    votes = []
+    last_pos = None
+    for last_pos, row in matched:
+        votes.append(row)
+
+    result = {
         'votes': votes,
         'year': year,
         'month': month
-    })
+    }
+    if limit is not None:
+        # 取滿一頁才可能有下一頁，以最後一筆的索引作為游標
+        result['next_after'] = last_pos if len(votes) == limit else None
+    return jsonify(result)
+
+
+def _stream_votes_ndjson(matched):
+    """逐批輸出 NDJSON（每行一筆投票記錄）"""
+    while True:
+        chunk = list(itertools.islice(matched, STREAM_CHUNK_ROWS))
+        if not chunk:
+            break
+        yield ''.join(json.dumps(row, ensure_ascii=False) + '\n' for _, row in chunk)
+
+
+def _stream_votes_csv(matched):
+    """逐批輸出 CSV（含 BOM，與 data 目錄下的檔案格式相同）"""
+    buffer = io.StringIO(newline='')
+    writer = csv.DictWriter(buffer, fieldnames=VOTE_FIELDS, extrasaction='ignore')
+    writer.writeheader()
+    yield '\ufeff' + buffer.getvalue()
+
+    while True:
+        chunk = list(itertools.islice(matched, STREAM_CHUNK_ROWS))
+        if not chunk:
+            break
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(row for _, row in chunk)
+        yield buffer.getvalue()
 
 
 
 @app.route('/api/statistics', methods=['GET'])
+@conditional_get(lambda: month_etag(datetime.now().year, datetime.now().month))
 def get_statistics():
     try:
         now = datetime.now()
         year = now.year
         month = now.month
-        vote_file = get_month_file(year, month)
-        all_votes = read_csv(vote_file)
-        
-        vote_counts = {}
-        for vote in all_votes:
-            voted_for_id = vote['voted_for_emp_id']
-            if voted_for_id not in vote_counts:
-                vote_counts[voted_for_id] = {
-                    'emp_id': voted_for_id,
-                    'name': vote['voted_for_name'],
-                    # 統一輸出 RR / 輪班
-                    'shift_type': normalize_shift(vote['voted_for_shift']),
-                    'vote_count': 0
-                }
-            vote_counts[voted_for_id]['vote_count'] += 1
-        
-        vote_stats = sorted(vote_counts.values(), key=lambda x: x['vote_count'], reverse=True)
+        state = get_month_state(year, month)
+        with state.lock:
+            vote_stats = state.tallies['all'].as_list()
         return jsonify({'vote_stats': vote_stats})
     except Exception as e:
         logger.error(f'獲取統計數據失敗: {str(e)}')
@@ -963,13 +3882,575 @@ def get_statistics():
 
 
 
+def _parse_year_month(value):
+    """'YYYYMM' → (year, month)，格式錯誤時丟出 ValueError"""
+    if len(value) != 6 or not value.isdigit() or not 1 <= int(value[4:]) <= 12:
+        raise ValueError(f'月份格式錯誤: {value}（應為 YYYYMM）')
+    return int(value[:4]), int(value[4:])
+
+
+@app.route('/api/analytics', methods=['GET'])
+def get_analytics():
+    """
+    任意月份區間的投票分析：候選人排行（含各投票班別的票數）、各班別投票 / 得票、投票班別 × 候選人班別矩陣
+    區間參數擇一：start / end (YYYYMM，含頭尾)；year（整年）或 year + quarter (1-4)；未指定時為最近 12 個月
+    limit: 排行榜只回傳前幾名
+    """
+    now = datetime.now()
+    year = request.args.get('year', type=int)
+    quarter = request.args.get('quarter', type=int)
+    limit = request.args.get('limit', type=int)
+
+    try:
+        if request.args.get('start') or request.args.get('end'):
+            start = _parse_year_month(request.args.get('start') or request.args.get('end'))
+            end = _parse_year_month(request.args.get('end') or request.args.get('start'))
+        elif year is not None and quarter is not None:
+            if not 1 <= quarter <= 4:
+                raise ValueError('quarter 必須為 1-4')
+            start, end = (year, quarter * 3 - 2), (year, quarter * 3)
+        elif year is not None:
+            start, end = (year, 1), (year, 12)
+        else:
+            end = (now.year, now.month)
+            start = (now.year - 1, now.month + 1) if now.month < 12 else (now.year, 1)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if start > end:
+        return jsonify({'error': 'start 不可晚於 end'}), 400
+    if limit is not None and limit < 1:
+        return jsonify({'error': 'limit 必須大於 0'}), 400
+
+    months = [key for key in storage.months() if start <= key <= end]
+    result = analyze_votes(months)
+    if limit is not None:
+        result['ranking'] = result['ranking'][:limit]
+
+    return jsonify({
+        'start': {'year': start[0], 'month': start[1]},
+        'end': {'year': end[0], 'month': end[1]},
+        **result
+    })
+
+
+# 原始資料匯出（ZIP 串流）
+EXPORT_CHUNK_SIZE = 1 << 16
+EXPORT_TABLES = ('votes', 'employees', 'monthly_votes', 'vote_log')
+
+
+class _ZipStream:
+    """
+    只能寫入的緩衝區，供 zipfile 寫到不可 seek 的串流（每個檔案以 data descriptor 結尾）
+    drain() 取出目前累積的位元組後清空
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _export_table_chunks(year, month, kind):
+    """
+    依序產生資料表的 CSV 內容（含 BOM，與 data 目錄下的檔案相同）
+    CSV 後端直接複製檔案（只讀到開檔當下的大小，不會讀到寫到一半的追加）；
+    封存月份與 SQLite 後端則逐筆讀取、逐批轉成 CSV
+    """
+    filepath = storage.path(year, month, kind) if isinstance(storage, CsvStorage) else None
+    if filepath is not None and filepath.exists():
+        with open(filepath, 'rb') as f:
+            remaining = os.fstat(f.fileno()).st_size
+            while remaining > 0:
+                chunk = f.read(min(EXPORT_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+        return
+
+    rows = storage.iter_rows(year, month, kind)
+    buffer = io.StringIO(newline='')
+    writer = csv.DictWriter(buffer, fieldnames=TABLE_FIELDS[kind], extrasaction='ignore')
+    writer.writeheader()
+    yield ('\ufeff' + buffer.getvalue()).encode('utf-8')
+    while True:
+        chunk = list(itertools.islice(rows, STREAM_CHUNK_ROWS))
+        if not chunk:
+            break
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(chunk)
+        yield buffer.getvalue().encode('utf-8')
+
+
+def _export_summary(year, month):
+    """月份摘要：各班別人數 / 投票人數 / 投票數與參與率（取自月份彙總，未快取的月份不會被載入記憶體）"""
+    rollup = get_month_rollup(year, month)
+    headcount, voters = rollup['headcount'], rollup['voters']
+    total_headcount = sum(headcount.values())
+    return {
+        'year': year,
+        'month': month,
+        'headcount': headcount,
+        'voters': voters,
+        'ballots': rollup['ballots'],
+        'participation_rate': {
+            **{shift: round(voters[shift] / headcount[shift] * 100, 1) if headcount[shift] else None
+               for shift in headcount},
+            'total': round(sum(voters.values()) / total_headcount * 100, 1) if total_headcount else None
+        }
+    }
+
+
+def iter_export_zip(months):
+    """
+    逐段產生 ZIP 內容：每個月份的 yyyymm.csv、employees.csv、monthly_votes.csv
+    （有尚未合併的增量記錄時另含 vote_log.csv）與 summary.json，路徑為 YYYY/MM/檔名
+    整個過程只保留一個區塊在記憶體中，也不寫入暫存檔
+    """
+    sink = _ZipStream()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for year, month in months:
+            prefix = f"{year}/{month:02d}/"
+            for kind in EXPORT_TABLES:
+                if not storage.exists(year, month, kind):
+                    continue
+                name = f"{year}{month:02d}.csv" if kind == 'votes' else f"{kind}.csv"
+                with archive.open(prefix + name, 'w', force_zip64=True) as dest:
+                    for chunk in _export_table_chunks(year, month, kind):
+                        dest.write(chunk)
+                        yield sink.drain()
+                yield sink.drain()
+
+            summary = json.dumps(_export_summary(year, month), ensure_ascii=False, indent=1)
+            archive.writestr(prefix + 'summary.json', summary)
+            yield sink.drain()
+    yield sink.drain()
+
+
+@app.route('/api/export', methods=['GET'])
+def export_data():
+    """
+    以 ZIP 串流匯出原始資料（僅管理員），邊產生邊傳送
+    start / end: YYYYMM（含頭尾），未指定時為所有有投票資料的月份
+    """
+    admin_id = request.args.get('admin_id')
+    if admin_id not in ['K18251', 'G9745']:
+        return jsonify({'error': '無權限'}), 403
+
+    months = storage.months()
+    try:
+        start = _parse_year_month(request.args['start']) if request.args.get('start') else None
+        end = _parse_year_month(request.args['end']) if request.args.get('end') else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if start and end and start > end:
+        return jsonify({'error': 'start 不可晚於 end'}), 400
+    months = [key for key in months if (start is None or key >= start) and (end is None or key <= end)]
+    if not months:
+        return jsonify({'error': '指定區間沒有資料'}), 404
+
+    filename = f"votes_{months[0][0]}{months[0][1]:02d}_{months[-1][0]}{months[-1][1]:02d}.zip"
+    return Response(
+        stream_with_context(chunk for chunk in iter_export_zip(months) if chunk),
+        mimetype='application/zip',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+
+# 前端靜態資源：內容雜湊檔名 + 預先壓縮
+ASSET_ROOT = Path(app.root_path)
+ASSET_BUILD_DIR = ASSET_ROOT / 'static' / 'dist'
+ASSET_PAGES = ('login.html', 'voting_system_vue.html', 'admin_panel.html')
+ASSET_MAX_AGE = 365 * 24 * 3600
+ASSET_MIN_COMPRESS_SIZE = 1024
+ASSET_ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+ASSET_REF_PATTERN = re.compile(r'(\b(?:src|href)=")([^"]+)(")')
+
+AssetEntry = namedtuple('AssetEntry', ['url', 'filename', 'digest', 'mimetype', 'encodings'])
+
+
+def _asset_sources():
+    """會被頁面引用的檔案（相對 ASSET_ROOT 的路徑）"""
+    sources = sorted(
+        path.relative_to(ASSET_ROOT).as_posix()
+        for path in (ASSET_ROOT / 'static' / 'js' / 'package').glob('*.js')
+    )
+    if (ASSET_ROOT / 'admin_panel.js').exists():
+        sources.append('admin_panel.js')
+    return sources
+
+
+def _compress_asset(data, encoding):
+    if encoding == 'gzip':
+        # mtime=0：相同內容產生相同位元組，多個 worker 各自建置也一致
+        return gzip.compress(data, compresslevel=9, mtime=0)
+    if encoding == 'br' and brotli is not None:
+        return brotli.compress(data, quality=11)
+    return None
+
+
+def _write_asset(path, data):
+    """內容定址，同名檔案已存在就不重寫；先寫暫存檔再改名，並行建置不會讀到半個檔案"""
+    if path.exists():
+        return
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+
+
+class AssetManifest:
+    """
+    建置並記錄前端資源
+    JS 以內容雜湊命名（/assets/vue.global.<hash>.js），可永久快取；頁面改寫引用後以原路徑提供並以 ETag 驗證
+    每個檔案另存 .gz（及安裝 brotli 時的 .br），回應時依 Accept-Encoding 直接送出壓縮檔
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.assets = {}
+        self.pages = {}
+        self.current = set()
+        self.signature = None
+        self.checked_at = 0.0
+
+    def _source_signature(self):
+        sig = []
+        for name in _asset_sources() + list(ASSET_PAGES):
+            try:
+                stat = (ASSET_ROOT / name).stat()
+            except FileNotFoundError:
+                continue
+            sig.append((name, stat.st_mtime_ns, stat.st_size))
+        return tuple(sig)
+
+    def _build_file(self, name, data, url=None):
+        """寫出一個檔案及其壓縮版本，回傳 AssetEntry；url 為 None 時以雜湊檔名作為網址"""
+        digest = hashlib.sha256(data).hexdigest()[:12]
+        path = Path(name)
+        filename = f"{path.stem}.{digest}{path.suffix}"
+        mimetype = mimetypes.guess_type(path.name)[0] or 'application/octet-stream'
+
+        _write_asset(ASSET_BUILD_DIR / filename, data)
+        encodings = []
+        if len(data) >= ASSET_MIN_COMPRESS_SIZE:
+            for encoding, suffix in ASSET_ENCODINGS:
+                target = ASSET_BUILD_DIR / f"{filename}{suffix}"
+                if not target.exists():
+                    compressed = _compress_asset(data, encoding)
+                    # 壓縮後沒有變小就不提供這個編碼
+                    if compressed is None or len(compressed) >= len(data):
+                        continue
+                    _write_asset(target, compressed)
+                encodings.append(encoding)
+        return AssetEntry(url or f"/assets/{filename}", filename, digest, mimetype, tuple(encodings))
+
+    def build(self):
+        """重新建置所有資源；舊的雜湊檔名仍保留在清單中，已載入舊頁面的瀏覽器不會拿到 404"""
+        with self.lock:
+            signature = self._source_signature()
+            ASSET_BUILD_DIR.mkdir(parents=True, exist_ok=True)
+
+            urls = {}
+            current = set()
+            for name in _asset_sources():
+                entry = self._build_file(name, (ASSET_ROOT / name).read_bytes())
+                self.assets[entry.filename] = entry
+                urls[name] = entry.url
+                current.add(entry.filename)
+
+            def rewrite(match):
+                ref = match.group(2).removeprefix('./')
+                return f"{match.group(1)}{urls.get(ref, match.group(2))}{match.group(3)}"
+
+            for page in ASSET_PAGES:
+                path = ASSET_ROOT / page
+                if not path.exists():
+                    continue
+                html = ASSET_REF_PATTERN.sub(rewrite, path.read_text(encoding='utf-8'))
+                self.pages[page] = self._build_file(page, html.encode('utf-8'), url=f"/{page}")
+                current.add(self.pages[page].filename)
+
+            self.current = current
+            self.signature = signature
+            self.checked_at = time.monotonic()
+            logger.info(f"📦 前端資源建置完成: {len(urls)} 個檔案, {len(self.pages)} 個頁面 → {ASSET_BUILD_DIR}")
+
+    def refresh(self):
+        """來源檔案有變動時重新建置（與 MonthState 相同的檢查間隔）"""
+        if self.signature is not None and time.monotonic() - self.checked_at < STATE_CHECK_INTERVAL:
+            return
+        if self._source_signature() != self.signature:
+            self.build()
+        else:
+            self.checked_at = time.monotonic()
+
+    def prune(self):
+        """刪除最近一次建置以外的檔案，回傳刪除數"""
+        keep = set(self.current)
+        keep.update(f"{filename}{suffix}" for filename in self.current for _, suffix in ASSET_ENCODINGS)
+        removed = 0
+        for path in ASSET_BUILD_DIR.iterdir():
+            if path.name not in keep:
+                path.unlink()
+                removed += 1
+        return removed
+
+
+assets = AssetManifest()
+
+
+def send_asset(entry, cache_control):
+    """依 Accept-Encoding 選擇預先壓縮的版本送出；ETag 依編碼區分，If-None-Match 相符時回 304"""
+    encoding = next(
+        (enc for enc, _ in ASSET_ENCODINGS if enc in entry.encodings and request.accept_encodings[enc]),
+        None
+    )
+    suffix = dict(ASSET_ENCODINGS).get(encoding, '')
+    response = send_from_directory(
+        ASSET_BUILD_DIR, f"{entry.filename}{suffix}", mimetype=entry.mimetype,
+        etag=f"{entry.digest}-{encoding or 'identity'}", max_age=ASSET_MAX_AGE
+    )
+    if encoding and response.status_code != 304:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Cache-Control'] = cache_control
+    response.vary.add('Accept-Encoding')
+    metrics.inc('vote_static_responses_total', encoding=encoding or 'identity', status=response.status_code)
+    return response
+
+
+@app.route('/assets/<path:filename>', methods=['GET'])
+def get_asset(filename):
+    """雜湊檔名的資源，內容不會變動，可永久快取"""
+    assets.refresh()
+    entry = assets.assets.get(filename)
+    if entry is None:
+        return jsonify({'error': '檔案不存在'}), 404
+    return send_asset(entry, f'public, max-age={ASSET_MAX_AGE}, immutable')
+
+
+@app.route('/', methods=['GET'])
+@app.route('/<page>', methods=['GET'])
+def get_page(page='login.html'):
+    """前端頁面；引用已改寫為雜湊網址，每次以 ETag 驗證以便取得新版本"""
+    assets.refresh()
+    entry = assets.pages.get(page)
+    if entry is None:
+        return jsonify({'error': '頁面不存在'}), 404
+    return send_asset(entry, 'no-cache')
+
+
+@app.cli.command('build-assets')
+@click.option('--prune', is_flag=True, help='刪除目前頁面未引用的舊建置檔')
+def build_assets(prune):
+    """預先建置前端資源的雜湊檔名與壓縮檔（flask --app app build-assets），未執行時於第一個請求建置"""
+    assets.build()
+    if prune:
+        logger.info(f"🧹 已刪除 {assets.prune()} 個舊建置檔")
+
+
+@app.cli.command('rebuild-catalog')
+def rebuild_catalog():
+    """手動複製月份目錄後，重新走訪資料目錄建立月份索引（flask --app app rebuild-catalog）"""
+    CsvStorage().catalog.rebuild()
+
+
+@app.cli.command('migrate-storage')
+def migrate_storage():
+    """將 data/YYYY/MM 下的 CSV 資料匯入 SQLite 儲存後端（flask --app app migrate-storage）"""
+    source = CsvStorage()
+    target = storage if isinstance(storage, SqliteStorage) else create_storage('sqlite')
+
+    total = 0
+    for year, month in source.all_months():
+        imported = 0
+        for kind in TABLE_FIELDS:
+            if source.exists(year, month, kind):
+                rows = source.read(year, month, kind)
+                target.write(year, month, kind, rows)
+                imported += len(rows)
+        logger.info(f"📦 {year}/{month} 匯入 {imported} 筆")
+        total += imported
+
+    logger.info(f"✅ 匯入完成,共 {total} 筆 → {target.db_path}")
+
+
+@app.cli.command('archive-months')
+@click.option('--month', 'year_month', default=None, help='只封存指定月份（YYYYMM），預設為本月以前的所有月份')
+def archive_months(year_month):
+    """將已結束月份的投票記錄轉為封存檔（flask --app app archive-months）"""
+    if not isinstance(storage, CsvStorage):
+        logger.warning(f"⚠️ {storage.name} 儲存後端不使用封存檔")
+        return
+
+    if year_month:
+        months = [(int(year_month[:4]), int(year_month[4:]))]
+    else:
+        now = datetime.now()
+        months = [key for key in storage.months() if key < (now.year, now.month)]
+
+    total = 0
+    for year, month in months:
+        total += archive_month(year, month) or 0
+    logger.info(f"✅ 封存完成,共 {total} 筆")
+
+
+# 正式環境（pre-fork）
+SERVER_HOST = config.get('SERVER', 'host', fallback='127.0.0.1')
+SERVER_PORT = config.getint('SERVER', 'port', fallback=5000)
+SERVER_WORKERS = config.getint('SERVER', 'workers', fallback=4)
+SERVER_THREADS = config.getint('SERVER', 'threads', fallback=32)
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """以固定大小的執行緒池處理連線的 WSGI 伺服器"""
+
+    multithread = True
+
+    def __init__(self, host, port, wsgi_app, threads, fd=None):
+        super().__init__(host, port, wsgi_app, fd=fd)
+        self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='http')
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._process_request, request, client_address)
+
+    def _process_request(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        # 傳入 fd 時 BaseWSGIServer.__init__ 會先呼叫一次，那時還沒有執行緒池
+        if hasattr(self, 'pool'):
+            self.pool.shutdown(wait=True)
+        super().server_close()
+
+
+def _run_worker(listener, host, port, threads):
+    """worker 主迴圈；收到 SIGTERM / SIGINT 時處理完進行中的請求再結束"""
+    server = PooledWSGIServer(host, port, app, threads, fd=listener.fileno())
+
+    def stop(signum, frame):
+        # 先讓推播連線結束，否則等待進行中請求時會卡在永不結束的串流
+        vote_stats_publisher.close()
+        # shutdown() 會等待 serve_forever 結束，必須在其他執行緒呼叫
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    logger.info(f"👷 worker {os.getpid()} 啟動,{threads} 個執行緒")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+def serve_prefork(host, port, workers, threads):
+    """
+    預先 fork 多個 worker 共用同一個監聽 socket
+    寫入以 MonthWriteLock（fcntl）跨行程互斥，快取以 SharedVersions 計數失效
+    不支援 fork 的平台（Windows）只啟動單一行程
+    """
+    listener = socket.create_server((host, port), backlog=1024)
+    # 多個 worker 同時被喚醒時，沒搶到連線的 accept 直接返回而不阻塞
+    listener.setblocking(False)
+    logger.info(f"🚀 監聽 http://{host}:{port}（{workers} 個 worker × {threads} 個執行緒）")
+
+    if workers <= 1 or not hasattr(os, 'fork'):
+        _run_worker(listener, host, port, threads)
+        return
+
+    children = set()
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                _run_worker(listener, host, port, threads)
+            except Exception as e:
+                logger.error(f"❌ worker {os.getpid()} 異常結束: {str(e)}")
+                code = 1
+            finally:
+                os._exit(code)
+        children.add(pid)
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(workers):
+        spawn()
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        children.discard(pid)
+        if not stopping:
+            logger.warning(f"⚠️ worker {pid} 結束（狀態 {status}）,重新啟動")
+            time.sleep(1)
+            spawn()
+
+    listener.close()
+    logger.info("👋 所有 worker 已結束")
+
+
+@app.cli.command('serve', with_appcontext=False)
+@click.option('--host', default=SERVER_HOST, show_default=True)
+@click.option('--port', default=SERVER_PORT, type=int, show_default=True)
+@click.option('--workers', default=SERVER_WORKERS, type=int, show_default=True, help='worker 行程數')
+@click.option('--threads', default=SERVER_THREADS, type=int, show_default=True, help='每個 worker 的執行緒數')
+def serve(host, port, workers, threads):
+    """正式環境啟動（flask --app app serve --workers 4 --threads 8），預設值見 config.ini [SERVER]"""
+    reserved = vote_admission.concurrency + vote_admission.queue_depth + SSE_MAX_STREAMS
+    if reserved >= threads:
+        logger.warning(
+            f"⚠️ 投票准入 {vote_admission.concurrency}+{vote_admission.queue_depth} 與推播連線 {SSE_MAX_STREAMS} "
+            f"可能佔滿全部 {threads} 個執行緒，讀取請求將無法處理；請調整 [SERVER] threads 或 [ADMISSION]"
+        )
+    # fork 前先載入名冊並建置前端資源，避免每個 worker 各自處理
+    load_employees_from_json()
+    assets.build()
+    serve_prefork(host, port, workers, threads)
+
+
 if __name__ == '__main__':
     # 啟動時載入員工資料到當前月份（如果不存在）
     load_employees_from_json()
+    assets.build()
     
     # 顯示當前月份的資料目錄
     now = datetime.now()
-    current_dir = get_month_dir()
+    current_dir = get_month_dir(create=True)
     logger.info(f"📁 當前資料目錄: {current_dir}")
     logger.info(f"📅 當前月份: {now.year}年{now.month}月")
     
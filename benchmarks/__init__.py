@@ -0,0 +1,13 @@
+"""
+效能基準測試
+- synthetic: 在暫存 DATA_ROOT 下產生合成月份資料
+- run: 計時 CSV / 票數 / 端點的熱路徑，輸出可比對的 JSON 結果
+- bench_employees: /api/employees 規模回歸測試
+"""
+import sys
+from pathlib import Path
+
+# 以 python benchmarks/xxx.py 或 python -m benchmarks.xxx 執行時都能匯入 app
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
@@ -0,0 +1,71 @@
+"""
+/api/employees 規模回歸測試
+以不同人數的合成名冊呼叫 /api/employees，確認耗時與人數成線性關係
+
+用法: python benchmarks/bench_employees.py [--sizes 500,1000,2000,5000]
+      或 python -m benchmarks.bench_employees
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from loguru import logger
+
+from benchmarks.synthetic import build_month
+
+import app as vote_app
+
+YEAR = 2000
+
+
+def time_endpoint(client, month, repeat):
+    """回傳最佳一次的耗時（秒）"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = client.get(f'/api/employees?year={YEAR}&month={month}')
+        elapsed = time.perf_counter() - start
+        assert response.status_code == 200
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='/api/employees 規模回歸測試')
+    parser.add_argument('--sizes', default='500,1000,2000,5000')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--tolerance', type=float, default=3.0,
+                        help='每人耗時最大/最小比值上限，超過視為非線性')
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.sizes.split(',')]
+    if len(sizes) > 12:
+        parser.error('最多 12 種人數（每種使用一個月份）')
+
+    logger.remove()
+    client = vote_app.app.test_client()
+    per_employee = []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        vote_app.DATA_ROOT = Path(tmp)
+        for month, size in enumerate(sizes, start=1):
+            # 約一半的人投過票
+            build_month(vote_app.DATA_ROOT, YEAR, month, size, ballots=size * 3 // 4)
+            elapsed = time_endpoint(client, month, args.repeat)
+            per_employee.append(elapsed / size)
+            print(f"{size:>7} 人  {elapsed * 1000:9.2f} ms  {elapsed / size * 1e6:7.2f} µs/人")
+
+    ratio = max(per_employee) / min(per_employee)
+    print(f"每人耗時最大/最小比值: {ratio:.2f}")
+    if ratio > args.tolerance:
+        print("❌ /api/employees 耗時未隨人數線性成長")
+        return 1
+    print("✅ /api/employees 耗時與人數成線性關係")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
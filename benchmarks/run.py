@@ -0,0 +1,191 @@
+"""
+熱路徑效能基準
+對每種名冊人數在暫存 DATA_ROOT 產生多個月份的合成資料，計時 CSV 讀寫、票數更新、
+月度統計重建與主要端點，結果輸出為 JSON，可與先前的結果比對
+
+用法: python -m benchmarks.run [--sizes 100,1000,10000] [--ballot-ratio 2] [--months 6]
+                               [--output results.json] [--compare baseline.json]
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from loguru import logger
+
+from benchmarks import ROOT
+from benchmarks.synthetic import build_history, emp_id, shift_of
+
+import app as vote_app
+
+
+def measure(func, repeat, reset=None):
+    """
+    執行 repeat 次，回傳 {'cold_ms', 'best_ms', 'mean_ms'}
+    reset: 每次冷啟動前呼叫（例如清空記憶體狀態），第一次計時即為冷啟動
+    """
+    if reset:
+        reset()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return {
+        'cold_ms': round(timings[0], 3),
+        'best_ms': round(min(timings), 3),
+        'mean_ms': round(sum(timings) / len(timings), 3)
+    }
+
+
+def get_ok(client, url):
+    def call():
+        response = client.get(url)
+        assert response.status_code == 200, (url, response.status_code)
+    return call
+
+
+def clear_states():
+    vote_app._month_states.clear()
+
+
+def bench_size(client, data_root, size, ballots, months, repeat, updates):
+    """單一名冊人數的所有案例"""
+    history = build_history(data_root, months, size, ballots)
+    year, month = history[-1]
+    votes_file = vote_app.get_month_file(year, month)
+    cases = {}
+
+    cases['read_csv'] = measure(lambda: vote_app.read_csv(votes_file), repeat)
+
+    rows = vote_app.read_csv(votes_file)
+    copy_file = data_root / 'write_csv.csv'
+    cases['write_csv'] = measure(
+        lambda: vote_app.write_csv(copy_file, rows, vote_app.VOTE_FIELDS), repeat
+    )
+
+    # 每次計時呼叫 updates 次，換算單次耗時
+    def update_batch():
+        for i in range(updates):
+            vote_app.update_monthly_votes(emp_id(i % size), shift_of(i % size), year, month)
+    result = measure(update_batch, repeat)
+    cases['update_monthly_votes'] = {key: round(value / updates, 4) for key, value in result.items()}
+
+    cases['rebuild_monthly_votes_from_records'] = measure(
+        lambda: vote_app.rebuild_monthly_votes_from_records(year, month), repeat, reset=clear_states
+    )
+    cases['GET /api/employees'] = measure(
+        get_ok(client, f'/api/employees?year={year}&month={month}'), repeat, reset=clear_states
+    )
+    cases['GET /api/vote_stats'] = measure(
+        get_ok(client, f'/api/vote_stats?year={year}&month={month}'), repeat, reset=clear_states
+    )
+    cases['GET /api/monthly_participation'] = measure(
+        get_ok(client, f'/api/monthly_participation?months={months}'), repeat, reset=clear_states
+    )
+
+    # 最舊的月份封存後冷載入排行榜
+    old_year, old_month = history[0]
+    if ballots and (old_year, old_month) != (year, month):
+        vote_app.archive_month(old_year, old_month)
+        cases['GET /api/vote_stats (archived)'] = measure(
+            get_ok(client, f'/api/vote_stats?year={old_year}&month={old_month}'), repeat, reset=clear_states
+        )
+
+    return [
+        {'name': name, 'size': size, 'ballots': ballots, 'months': months, 'repeat': repeat, **timing}
+        for name, timing in cases.items()
+    ]
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path, threshold):
+    """與先前的結果比對 best_ms，回傳退步的案例數"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = {
+            (r['name'], r['size']): r for r in json.load(f)['results']
+        }
+    regressions = 0
+    print(f"\n與 {baseline_path} 比對（best_ms，比值 > {threshold} 視為退步）")
+    for result in results:
+        old = baseline.get((result['name'], result['size']))
+        if old is None or not old['best_ms']:
+            continue
+        ratio = result['best_ms'] / old['best_ms']
+        flag = '❌' if ratio > threshold else '  '
+        regressions += ratio > threshold
+        print(f"{flag} {result['name']:<38} {result['size']:>7}  "
+              f"{old['best_ms']:>10.3f} → {result['best_ms']:>10.3f} ms  ×{ratio:.2f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='CSV / 票數 / 端點熱路徑效能基準')
+    parser.add_argument('--sizes', default='100,1000,10000',
+                        help='名冊人數，逗號分隔（例如 100,1000,10000,100000）')
+    parser.add_argument('--ballot-ratio', type=float, default=2.0,
+                        help='每月投票記錄筆數 = 人數 × 此比例')
+    parser.add_argument('--months', type=int, default=6, help='產生的歷史月份數（含本月）')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--updates', type=int, default=100,
+                        help='update_monthly_votes 每次計時的呼叫次數')
+    parser.add_argument('--output', help='結果 JSON 檔')
+    parser.add_argument('--compare', help='先前的結果 JSON 檔')
+    parser.add_argument('--threshold', type=float, default=1.5)
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.sizes.split(',')]
+
+    logger.remove()
+    vote_app.app.config['TESTING'] = True
+    client = vote_app.app.test_client()
+    results = []
+
+    for size in sizes:
+        ballots = int(size * args.ballot_ratio)
+        with tempfile.TemporaryDirectory() as tmp:
+            vote_app.DATA_ROOT = Path(tmp)
+            clear_states()
+            for result in bench_size(client, Path(tmp), size, ballots, args.months,
+                                     args.repeat, args.updates):
+                results.append(result)
+                print(f"{result['name']:<38} {size:>7} 人  冷 {result['cold_ms']:>10.3f} ms  "
+                      f"最佳 {result['best_ms']:>10.3f} ms")
+        clear_states()
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'storage_backend': type(vote_app.storage).__name__,
+            'args': vars(args)
+        },
+        'results': results
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=1)
+        print(f"\n結果已寫入 {args.output}")
+
+    if args.compare and compare(results, args.compare, args.threshold):
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,104 @@
+"""
+合成資料產生器
+在指定的資料目錄下產生與 app.py 相同格式的月份資料：
+employees.csv、monthly_votes.csv 與 yyyymm.csv 投票記錄（票數與投票記錄一致）
+"""
+import csv
+import random
+from datetime import datetime
+
+import app as vote_app
+
+
+def emp_id(i):
+    return f"E{i:06d}"
+
+
+def shift_of(i):
+    """單數為 RR(2000)、雙數為輪班(3000)"""
+    return '2000' if i % 2 else '3000'
+
+
+def _writer(path, fieldnames):
+    f = open(path, 'w', newline='', encoding='utf-8-sig')
+    writer = csv.DictWriter(f, fieldnames=fieldnames)
+    writer.writeheader()
+    return f, writer
+
+
+def build_month(data_root, year, month, roster_size, ballots=0, seed=None):
+    """
+    產生一個月份：roster_size 人的名冊與 ballots 筆投票記錄
+    投票者隨機挑選，每筆投給另一班別的隨機候選人；回傳月份目錄
+    """
+    rng = random.Random(seed if seed is not None else hash((year, month, roster_size, ballots)))
+    month_dir = data_root / str(year) / f"{month:02d}"
+    month_dir.mkdir(parents=True, exist_ok=True)
+    year_month = f"{year}{month:02d}"
+
+    votes_used = {}
+    last_vote_time = {}
+    if ballots:
+        f, writer = _writer(month_dir / f"{year_month}.csv", vote_app.VOTE_FIELDS)
+        with f:
+            for n in range(ballots):
+                voter = rng.randrange(roster_size)
+                # 另一班別的候選人：奇偶相反
+                candidate = rng.randrange(roster_size // 2) * 2 + (0 if voter % 2 else 1)
+                timestamp = f"{year}-{month:02d}-{1 + n * 27 // ballots:02d} 12:00:00"
+                writer.writerow({
+                    'timestamp': timestamp,
+                    'year_month': year_month,
+                    'voter_emp_id': emp_id(voter),
+                    'voter_name': f"員工{voter}",
+                    'voter_shift': shift_of(voter),
+                    'voted_for_emp_id': emp_id(candidate),
+                    'voted_for_name': f"員工{candidate}",
+                    'voted_for_shift': shift_of(candidate)
+                })
+                votes_used[voter] = votes_used.get(voter, 0) + 1
+                last_vote_time[voter] = timestamp
+
+    f, writer = _writer(month_dir / 'employees.csv', vote_app.EMPLOYEE_FIELDS)
+    with f:
+        for i in range(roster_size):
+            writer.writerow({
+                'emp_id': emp_id(i),
+                'name': f"員工{i}",
+                'shift_type': shift_of(i),
+                'has_voted': '1' if i in votes_used else '0',
+                'last_vote_time': last_vote_time.get(i, '')
+            })
+
+    f, writer = _writer(month_dir / 'monthly_votes.csv', vote_app.MONTHLY_VOTES_FIELDS)
+    with f:
+        for i in sorted(votes_used):
+            writer.writerow({
+                'emp_id': emp_id(i),
+                'year_month': year_month,
+                'shift_type': shift_of(i),
+                'votes_used': str(votes_used[i])
+            })
+
+    return month_dir
+
+
+def recent_months(count, end=None):
+    """以 end（預設本月）為最後一個月的連續 count 個月份，由舊到新"""
+    end = end or datetime.now()
+    year, month = end.year, end.month
+    months = []
+    for _ in range(count):
+        months.append((year, month))
+        month -= 1
+        if month < 1:
+            year, month = year - 1, 12
+    return months[::-1]
+
+
+def build_history(data_root, months, roster_size, ballots, end=None):
+    """產生連續 months 個月份（到本月為止）的資料，回傳月份列表"""
+    history = recent_months(months, end)
+    for year, month in history:
+        build_month(data_root, year, month, roster_size, ballots)
+    return history